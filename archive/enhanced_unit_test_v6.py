@@ -1,98 +1,177 @@
+import asyncio
+import atexit
+import select
 import socket
+import struct
 import time
 import sys
-import binascii  # For better hex display of packets
+import logging
+
+from packet_codec import (
+    STATE_NOT_READY, STATE_SWITCH_ON_DISABLED, STATE_READY_TO_SWITCH_ON,
+    STATE_SWITCHED_ON, STATE_OPERATION_ENABLED, STATE_FAULT,
+    STATE_NAMES, MAX_ADU_SIZE, TCP_KEEPALIVE_OPTIONS,
+    build_read_packet, build_write_packet, parse_response,
+    classify_statusword, format_statusword, interpret_controlword,
+    enable_keepalive, is_alive, recv_exact, set_buffer_sizes
+)
+
+# Packet dumps and per-request details are logged at DEBUG level, enabled with --verbose
+logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(message)s")
+logger = logging.getLogger("motor_test")
 
 # Motor controller IP addresses
 Y_CONTROLLER_IP = "169.254.239.1"
 Z_CONTROLLER_IP = "169.254.239.2"
 MODBUS_PORT = 502
 
-# Define state machine states for better tracking
-STATE_NOT_READY = 0
-STATE_SWITCH_ON_DISABLED = 1
-STATE_READY_TO_SWITCH_ON = 2
-STATE_SWITCHED_ON = 3
-STATE_OPERATION_ENABLED = 4
-STATE_FAULT = 5
-STATE_UNKNOWN = 6
-
-STATE_NAMES = {
-    STATE_NOT_READY: "Not Ready to Switch On",
-    STATE_SWITCH_ON_DISABLED: "Switch On Disabled",
-    STATE_READY_TO_SWITCH_ON: "Ready to Switch On",
-    STATE_SWITCHED_ON: "Switched On",
-    STATE_OPERATION_ENABLED: "Operation Enabled",
-    STATE_FAULT: "Fault",
-    STATE_UNKNOWN: "Unknown State"
+CONNECT_TIMEOUT = 5    # Seconds to establish the TCP connection
+RESPONSE_TIMEOUT = 0.2 # Seconds to wait for each response once connected
+DIAGNOSTIC_TIMEOUT = 2 # Seconds to wait for a reply to a diagnostic probe, which may be ignored
+MOVE_TIMEOUT = 20      # Seconds to wait for a movement to complete
+POLL_INTERVAL = 0.05   # Seconds to yield between movement status polls
+
+# Pacing of the movement polls (see PollScheduler)
+MIN_INTER_REQUEST_MS = 0     # Minimum gap between two requests
+SLOW_POLL_THRESHOLD = 0.02   # Skip the position read if the statusword poll took longer (s)
+BACKOFF_MIN_GAP = 0.01       # First gap (s) used once the gateway rejects a request
+BACKOFF_STEP = 0.005         # Gap reduction (s) per accepted request
+
+# The shared keepalive options plus a 2 s user timeout, so a dead controller is
+# reported by the OS in ~2-3 s instead of waiting out every response timeout
+KEEPALIVE_OPTIONS = TCP_KEEPALIVE_OPTIONS + (
+    ("TCP_USER_TIMEOUT", 2000),  # Milliseconds, Linux only
+)
+
+# Some gateways only accept one ADU per TCP segment and one outstanding
+# request; set to True to make submit_linked() send requests one at a time
+STRICT_COMPLIANCE = False
+
+# How long (seconds) read_object_cached() may reuse a value, per object index
+OBJECT_CACHE_TTL = {
+    0x6041: 0,             # Statusword - always read from the controller
+    0x6061: float("inf"),  # Modes of Operation Display - invalidated by writes to 6060h
+    0x6092: float("inf")   # Feed constant
+}
+
+# Cached objects that change when another object is written
+CACHE_DEPENDENTS = {
+    0x6060: (0x6061,)      # Modes of Operation -> Modes of Operation Display
+}
+
+class ModbusSocket(socket.socket):
+    """TCP socket that keeps the Modbus transaction state of its connection"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tx_id = 0
+        self.tx_buf = bytearray(MAX_ADU_SIZE)  # Private writable copy of the outgoing packet
+        self.rx_buf = bytearray(MAX_ADU_SIZE)  # Reused for every response on this connection
+        self.object_cache = {}  # (index, sub_index) -> (value, expiry)
+        self.exception_responses = 0  # Responses with the exception bit (0x80) set
+        self.last_state = None  # Drive state reached by the last state machine walk
+
+# Fixed packets used by the state machine, built once at import.
+# The transaction ID is stamped per connection by send_packet().
+PKT_READ_STATUSWORD = bytes(build_read_packet(0x6041, 0, 2))
+PKT_READ_POSITION = bytes(build_read_packet(0x6064, 0, 4))
+PKT_CW_SHUTDOWN = bytes(build_write_packet(0x6040, 0, 0x0006, 2))
+PKT_CW_SWITCH_ON = bytes(build_write_packet(0x6040, 0, 0x0007, 2))
+PKT_CW_ENABLE_OP = bytes(build_write_packet(0x6040, 0, 0x000F, 2))
+PKT_CW_START_MOVE = bytes(build_write_packet(0x6040, 0, 0x001F, 2))
+PKT_CW_FAULT_RESET = bytes(build_write_packet(0x6040, 0, 0x0080, 2))
+
+# Standard Modbus request used to probe the controller outside the gateway
+PKT_READ_HOLDING_REGISTER = bytes([
+    0x00, 0x01,  # Transaction ID
+    0x00, 0x00,  # Protocol ID
+    0x00, 0x06,  # Length
+    0x01,        # Unit ID
+    0x03,        # Function code: Read Holding Registers
+    0x00, 0x00,  # Starting address (0)
+    0x00, 0x01   # Quantity of registers (1)
+])
+
+CONTROLWORD_PACKETS = {
+    0x0006: PKT_CW_SHUTDOWN,
+    0x0007: PKT_CW_SWITCH_ON,
+    0x000F: PKT_CW_ENABLE_OP,
+    0x001F: PKT_CW_START_MOVE,
+    0x0080: PKT_CW_FAULT_RESET
 }
 
-def build_read_packet(index, sub_index, size):
-    """Create a correctly formatted Modbus TCP Gateway read packet"""
-    return bytearray([
-        0x00, 0x0F,  # Transaction ID
-        0x00, 0x00,  # Protocol ID
-        0x00, 0x0D,  # Length
-        0x00,        # Unit ID
-        0x2B,        # Function code
-        0x0D,        # MEI type
-        0x00,        # Protocol option (0=read)
-        0x00,        # Reserved
-        0x00,        # Node ID
-        (index >> 8) & 0xFF, index & 0xFF,  # Object Index
-        sub_index,   # Sub Index
-        0x00, 0x00,  # Starting Address
-        0x00,        # SDO Object
-        size         # Byte count
-    ])
-
-def build_write_packet(index, sub_index, value, size):
-    """Create a correctly formatted Modbus TCP Gateway write packet"""
-    # Basic header
-    packet = bytearray([
-        0x00, 0x0F,  # Transaction ID
-        0x00, 0x00,  # Protocol ID
-        0x00, 0x0D + size,  # Length (13 + data size)
-        0x00,        # Unit ID
-        0x2B,        # Function code
-        0x0D,        # MEI type
-        0x01,        # Protocol option (1=write)
-        0x00,        # Reserved
-        0x00,        # Node ID
-        (index >> 8) & 0xFF, index & 0xFF,  # Object Index 
-        sub_index,   # Sub Index
-        0x00, 0x00,  # Starting Address
-        0x00,        # SDO Object
-        size,        # Byte count
-    ])
-    
-    # Add value in little endian format
-    value_bytes = bytearray()
-    for i in range(size):
-        value_bytes.append((value >> (8*i)) & 0xFF)
-    
-    packet.extend(value_bytes)
-    return packet
+def send_packet(sock, packet):
+    """Send a packet with the next transaction ID of this connection"""
+    sock.tx_id = (sock.tx_id + 1) & 0xFFFF
+    size = len(packet)
+    sock.tx_buf[:size] = packet
+    struct.pack_into(">H", sock.tx_buf, 0, sock.tx_id)
+    
+    frame = memoryview(sock.tx_buf)[:size]
+    print_packet(frame, True)
+    sock.sendall(frame)
+
+def recv_packet(sock):
+    """Receive one complete response frame into the connection's buffer
+    (valid until the next receive)"""
+    view = memoryview(sock.rx_buf)
+    recv_exact(sock, view[:6])  # MBAP header, length in bytes 4-5
+    size = min(6 + struct.unpack_from(">H", view, 4)[0], MAX_ADU_SIZE)
+    recv_exact(sock, view[6:size])
+    
+    response = view[:size]
+    if size > 7 and response[7] & 0x80:
+        sock.exception_responses += 1
+    print_packet(response, False)
+    return response
+
+def recv_transaction(sock, tx_id):
+    """Receive the response to the given transaction into the connection's buffer
+    (valid until the next receive). Late responses to earlier transactions, whose
+    wait already timed out, are dropped on the way."""
+    while True:
+        response = recv_packet(sock)
+        response_id = struct.unpack_from(">H", response, 0)[0]
+        if response_id == tx_id:
+            return response
+        logger.debug("Dropped stale response to transaction 0x%04X", response_id)
+
+def recv_matching(sock, tx_id):
+    """Receive the response to the given transaction as a standalone copy"""
+    return bytes(recv_transaction(sock, tx_id))
+
+def submit_linked(sock, packets):
+    """Send several requests with a single write and collect their responses in order"""
+    if STRICT_COMPLIANCE:
+        responses = []
+        for packet in packets:
+            send_packet(sock, packet)
+            responses.append(recv_matching(sock, sock.tx_id))
+        return responses
+    
+    batch = bytearray()
+    tx_ids = []
+    for packet in packets:
+        sock.tx_id = (sock.tx_id + 1) & 0xFFFF
+        offset = len(batch)
+        batch += packet
+        struct.pack_into(">H", batch, offset, sock.tx_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            print_packet(batch[offset:], True)
+        tx_ids.append(sock.tx_id)
+    sock.sendall(batch)
+    
+    return [recv_matching(sock, tx_id) for tx_id in tx_ids]
 
 def test_alternative_protocols(sock):
     """Try different protocols to see what the controller responds to"""
     print("\n=== Testing Alternative Protocol Formats ===")
+    sock.settimeout(DIAGNOSTIC_TIMEOUT)
     
     # Test 1: Try standard Modbus read holding registers
     try:
         print("\nTest 1: Standard Modbus read holding registers")
-        std_packet = bytearray([
-            0x00, 0x01,  # Transaction ID
-            0x00, 0x00,  # Protocol ID
-            0x00, 0x06,  # Length
-            0x01,        # Unit ID
-            0x03,        # Function code: Read Holding Registers
-            0x00, 0x00,  # Starting address (0)
-            0x00, 0x01   # Quantity of registers (1)
-        ])
-        
-        print_packet(std_packet, True)
-        sock.send(std_packet)
+        print_packet(PKT_READ_HOLDING_REGISTER, True)
+        sock.sendall(PKT_READ_HOLDING_REGISTER)
         
         response = sock.recv(1024)
         print_packet(response, False)
@@ -118,7 +197,7 @@ def test_alternative_protocols(sock):
         ])
         
         print_packet(std_packet, True)
-        sock.send(std_packet)
+        sock.sendall(std_packet)
         
         response = sock.recv(1024)
         print_packet(response, False)
@@ -152,7 +231,7 @@ def test_alternative_protocols(sock):
         ])
         
         print_packet(alt_packet, True)
-        sock.send(alt_packet)
+        sock.sendall(alt_packet)
         
         response = sock.recv(1024)
         print_packet(response, False)
@@ -171,7 +250,7 @@ def test_alternative_protocols(sock):
         alt_packet = build_read_packet(0x1000, 0, 4)
         
         print_packet(alt_packet, True)
-        sock.send(alt_packet)
+        sock.sendall(alt_packet)
         
         response = sock.recv(1024)
         print_packet(response, False)
@@ -204,7 +283,7 @@ def test_alternative_protocols(sock):
         ])
         
         print_packet(alt_packet, True)
-        sock.send(alt_packet)
+        sock.sendall(alt_packet)
         
         response = sock.recv(1024)
         print_packet(response, False)
@@ -224,146 +303,137 @@ def test_alternative_protocols(sock):
     
     return
     
-def decode_statusword(statusword):
-    """Decode statusword to human-readable state based on Section 6.5.10 of manual"""
-    state = STATE_UNKNOWN
-    
-    # Extract state bits according to manual
-    if (statusword & 0x004F) == 0x0000:  # xxxx xxxx x0xx 0000
-        state = STATE_NOT_READY
-    elif (statusword & 0x004F) == 0x0040:  # xxxx xxxx x1xx 0000
-        state = STATE_SWITCH_ON_DISABLED
-    elif (statusword & 0x006F) == 0x0021:  # xxxx xxxx x01x 0001
-        state = STATE_READY_TO_SWITCH_ON
-    elif (statusword & 0x006F) == 0x0023:  # xxxx xxxx x01x 0011
-        state = STATE_SWITCHED_ON
-    elif (statusword & 0x006F) == 0x0027:  # xxxx xxxx x01x 0111
-        state = STATE_OPERATION_ENABLED
-    elif (statusword & 0x004F) == 0x0008:  # xxxx xxxx x0xx 1000
-        state = STATE_FAULT
-    
-    description = STATE_NAMES.get(state, "Unknown State")
-    result = f"State: {description} (0x{statusword:04X})"
-    
-    # Additional flags
-    if statusword & 0x0080:
-        result += ", Warning"
-    if statusword & 0x0400:
-        result += ", Target Reached"
-    if statusword & 0x0200:
-        result += ", Remote (DI7=1)"
-    else:
-        result += ", NOT Remote (DI7=0) - ENABLE IS OFF!"
-    if statusword & 0x0800:
-        result += ", Internal Limit Active"
-    
-    return result
-
 def print_packet(packet, is_send=True):
-    """Print packet in readable format for debugging"""
+    """Log packet in readable format for debugging (skipped unless DEBUG is enabled)"""
+    # For shorter packets, we need special handling
+    short_response = not is_send and len(packet) < 18
+    if short_response:
+        logger.warning("  WARNING: Received a short packet! This may indicate a protocol mismatch.")
+        logger.warning("  This is likely a standard Modbus response instead of Modbus TCP Gateway response.")
+        logger.warning("  Check the controller configuration - Modbus TCP Gateway may not be properly activated.")
+    
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    
     direction = "SEND" if is_send else "RECV"
-    print(f"{direction} Packet ({len(packet)} bytes):")
-    print(f"  Hex: {binascii.hexlify(packet).decode()}")
+    logger.debug(f"{direction} Packet ({len(packet)} bytes):")
+    logger.debug(f"  Hex: {packet.hex()}")
     
-    # For shorter packets, we need special handling
-    if not is_send and len(packet) < 18:
-        print("  WARNING: Received a short packet! This may indicate a protocol mismatch.")
-        print("  This is likely a standard Modbus response instead of Modbus TCP Gateway response.")
-        print("  Check the controller configuration - Modbus TCP Gateway may not be properly activated.")
-        
+    if short_response:
         # Try to parse standard Modbus response
         if len(packet) > 7:
-            print(f"  Function code: 0x{packet[7]:02X}")
+            logger.debug(f"  Function code: 0x{packet[7]:02X}")
             if packet[7] & 0x80:  # Error response
-                print(f"  ERROR RESPONSE detected")
+                logger.debug(f"  ERROR RESPONSE detected")
                 if len(packet) > 8:
-                    print(f"  Exception code: 0x{packet[8]:02X}")
-                    print(f"  This indicates a protocol or command error.")
+                    logger.debug(f"  Exception code: 0x{packet[8]:02X}")
+                    logger.debug(f"  This indicates a protocol or command error.")
         return
     
     if len(packet) >= 8:  # Minimum parsing
         if is_send:
-            print(f"  Transaction ID: 0x{packet[0]:02X}{packet[1]:02X}")
-            print(f"  Protocol ID: 0x{packet[2]:02X}{packet[3]:02X}")
-            print(f"  Length: {packet[4]:02X}{packet[5]:02X}")
-            print(f"  Unit ID: {packet[6]:02X}")
-            print(f"  Function code: 0x{packet[7]:02X}")
+            logger.debug(f"  Transaction ID: 0x{packet[0]:02X}{packet[1]:02X}")
+            logger.debug(f"  Protocol ID: 0x{packet[2]:02X}{packet[3]:02X}")
+            logger.debug(f"  Length: {packet[4]:02X}{packet[5]:02X}")
+            logger.debug(f"  Unit ID: {packet[6]:02X}")
+            logger.debug(f"  Function code: 0x{packet[7]:02X}")
             
             if len(packet) >= 10:
-                print(f"  MEI type: 0x{packet[8]:02X}")
-                print(f"  Protocol option: {packet[9]:02X} ({['Read', 'Write'][packet[9] if packet[9] <= 1 else 0]})")
+                logger.debug(f"  MEI type: 0x{packet[8]:02X}")
+                logger.debug(f"  Protocol option: {packet[9]:02X} ({['Read', 'Write'][packet[9] if packet[9] <= 1 else 0]})")
             
             if len(packet) >= 19:
                 if packet[9] == 0:  # Read
-                    print(f"  Object: 0x{packet[12]:02X}{packet[13]:02X}:{packet[14]:02X}")
-                    print(f"  Byte count: {packet[18]:02X}")
+                    logger.debug(f"  Object: 0x{packet[12]:02X}{packet[13]:02X}:{packet[14]:02X}")
+                    logger.debug(f"  Byte count: {packet[18]:02X}")
                 elif packet[9] == 1 and len(packet) > 19:  # Write
-                    print(f"  Object: 0x{packet[12]:02X}{packet[13]:02X}:{packet[14]:02X}")
-                    print(f"  Byte count: {packet[18]:02X}")
+                    logger.debug(f"  Object: 0x{packet[12]:02X}{packet[13]:02X}:{packet[14]:02X}")
+                    logger.debug(f"  Byte count: {packet[18]:02X}")
                     if len(packet) >= 19 + packet[18]:
                         data = int.from_bytes(packet[19:19+packet[18]], byteorder='little')
-                        print(f"  Data: 0x{data:X} ({data})")
+                        logger.debug(f"  Data: 0x{data:X} ({data})")
         else:
             # Response packet parsing
             if packet[7] & 0x80:  # Error response
-                print(f"  ERROR RESPONSE: Function code: 0x{packet[7]:02X}")
+                logger.debug(f"  ERROR RESPONSE: Function code: 0x{packet[7]:02X}")
                 if len(packet) > 8:
-                    print(f"  Exception code: 0x{packet[8]:02X}")
+                    logger.debug(f"  Exception code: 0x{packet[8]:02X}")
             else:
                 if len(packet) >= 10 and packet[7] == 0x2B:  # Standard response
-                    print(f"  Response Function code: 0x{packet[7]:02X}")
-                    print(f"  MEI type: 0x{packet[8]:02X}")
-                    print(f"  Protocol option: {packet[9]:02X} ({['Read', 'Write'][packet[9] if packet[9] <= 1 else 0]})")
+                    logger.debug(f"  Response Function code: 0x{packet[7]:02X}")
+                    logger.debug(f"  MEI type: 0x{packet[8]:02X}")
+                    logger.debug(f"  Protocol option: {packet[9]:02X} ({['Read', 'Write'][packet[9] if packet[9] <= 1 else 0]})")
                     
                     if len(packet) >= 19 and packet[9] == 0 and packet[18] > 0:  # Read response
                         data_length = packet[18]
                         if 19 + data_length <= len(packet):
                             data = int.from_bytes(packet[19:19+data_length], byteorder='little')
-                            print(f"  Data: 0x{data:X} ({data})")
+                            logger.debug(f"  Data: 0x{data:X} ({data})")
                             
                             if packet[12] == 0x60 and packet[13] == 0x41:  # Statusword
-                                print(f"  {decode_statusword(data)}")
+                                logger.debug(f"  {format_statusword(data)}")
 
 def create_connection(ip_address, port=MODBUS_PORT):
     """Create a socket connection to the motor controller"""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(5)  # 5 second timeout
+    sock = ModbusSocket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
     
     try:
+        set_buffer_sizes(sock)
+        
         print(f"Connecting to {ip_address}:{port}...")
         sock.connect((ip_address, port))
+        
+        # Send small requests immediately and detect dead links at the OS level
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        enable_keepalive(sock, KEEPALIVE_OPTIONS)
+        sock.settimeout(RESPONSE_TIMEOUT)
+        
+        # The OS may round the buffer sizes (Linux doubles them)
+        logger.debug("Socket buffers: send %d bytes, receive %d bytes",
+                     sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF),
+                     sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF))
+        
         print("Connected successfully!")
         return sock
     except Exception as e:
         print(f"Connection failed: {e}")
+        sock.close()
         return None
 
+# Open connections per controller IP, reused across menu actions
+_sockets = {}
+
+def get_sock(ip_address):
+    """Return the pooled connection to a controller, reconnecting if it was dropped"""
+    sock = _sockets.get(ip_address)
+    if sock is not None:
+        if is_alive(sock):
+            return sock
+        print(f"Connection to {ip_address} was dropped, reconnecting...")
+        sock.close()
+        del _sockets[ip_address]
+    
+    sock = create_connection(ip_address)
+    if sock:
+        _sockets[ip_address] = sock
+    return sock
+
+def _close_all():
+    """Close every pooled connection"""
+    for sock in _sockets.values():
+        sock.close()
+    _sockets.clear()
+
+atexit.register(_close_all)
+
 def read_statusword(sock):
     """Read the statusword (object 6041h) using the format from manual"""
     try:
         # Format according to section 6.6.5 of the manual
-        packet = bytearray([
-            0x00, 0x0F,  # Transaction ID
-            0x00, 0x00,  # Protocol ID
-            0x00, 0x0D,  # Length
-            0x00,        # Unit ID
-            0x2B,        # Function code
-            0x0D,        # MEI type
-            0x00,        # Protocol option (0=read)
-            0x00,        # Reserved
-            0x00,        # Node ID
-            0x60, 0x41,  # Object Index (6041h)
-            0x00,        # Sub Index
-            0x00, 0x00,  # Starting Address
-            0x00,        # SDO Object
-            0x02         # Byte count
-        ])
+        send_packet(sock, PKT_READ_STATUSWORD)
         
-        print_packet(packet, True)
-        sock.send(packet)
-        
-        response = sock.recv(1024)
-        print_packet(response, False)
+        response = recv_transaction(sock, sock.tx_id)
         
         # Check for short response (non-gateway response)
         if len(response) < 18:
@@ -375,10 +445,11 @@ def read_statusword(sock):
             return None
             
         # According to section 6.6.6, the statusword should be in bytes 19-20 (little endian)
-        if len(response) >= 21:
-            statusword = response[19] | (response[20] << 8)
-            print(f"Statusword: 0x{statusword:04X}")
-            print(decode_statusword(statusword))
+        statusword = parse_response(response, 2)
+        if statusword is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Statusword: 0x{statusword:04X}")
+                logger.debug(format_statusword(statusword))
             return statusword
         else:
             print("Response too short")
@@ -392,30 +463,19 @@ def write_controlword(sock, value):
     """Write to the controlword (object 6040h)"""
     try:
         # Format according to section 6.6.5 of the manual
-        packet = bytearray([
-            0x00, 0x0F,  # Transaction ID
-            0x00, 0x00,  # Protocol ID
-            0x00, 0x0F,  # Length (15 bytes after byte 5)
-            0x00,        # Unit ID
-            0x2B,        # Function code
-            0x0D,        # MEI type
-            0x01,        # Protocol option (1=write)
-            0x00,        # Reserved
-            0x00,        # Node ID
-            0x60, 0x40,  # Object Index (6040h)
-            0x00,        # Sub Index
-            0x00, 0x00,  # Starting Address
-            0x00,        # SDO Object
-            0x02,        # Byte count
-            value & 0xFF, (value >> 8) & 0xFF  # Value (little endian)
-        ])
+        packet = CONTROLWORD_PACKETS.get(value)
+        if packet is None:
+            packet = build_write_packet(0x6040, 0, value, 2)
         
-        print(f"Writing controlword: 0x{value:04X} - {interpret_controlword(value)}")
-        print_packet(packet, True)
-        sock.send(packet)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Writing controlword: 0x{value:04X} - {interpret_controlword(value)}")
+        send_packet(sock, packet)
         
-        response = sock.recv(1024)
-        print_packet(response, False)
+        response = recv_transaction(sock, sock.tx_id)
+        
+        if response[7] & 0x80:
+            print(f"ERROR: Controller rejected controlword 0x{value:04X}")
+            return False
         
         return True
             
@@ -423,112 +483,65 @@ def write_controlword(sock, value):
         print(f"Error writing controlword: {e}")
         return False
 
-def interpret_controlword(value):
-    """Translate controlword bits to human-readable form"""
-    result = []
-    
-    if value & 0x0001:
-        result.append("Switch On")
-    if value & 0x0002:
-        result.append("Enable Voltage")
-    if value & 0x0004:
-        result.append("Quick-Stop")
-    if value & 0x0008:
-        result.append("Enable Operation")
-    if value & 0x0010:
-        result.append("Start/Homing")
-    if value & 0x0020:
-        result.append("Apply Parameters")
-    if value & 0x0040:
-        result.append("Relative/Absolute")
-    if value & 0x0080:
-        result.append("Fault Reset")
-    if value & 0x0100:
-        result.append("Halt")
-    
-    return ", ".join(result)
-
 def write_object(sock, index, sub_index, value, size):
     """Write to a CANopen object"""
+    invalidate(sock, index)
     try:
-        # Basic header
-        packet = bytearray([
-            0x00, 0x0F,  # Transaction ID
-            0x00, 0x00,  # Protocol ID
-            0x00, 0x0D + size,  # Length (13 + data size)
-            0x00,        # Unit ID
-            0x2B,        # Function code
-            0x0D,        # MEI type
-            0x01,        # Protocol option (1=write)
-            0x00,        # Reserved
-            0x00,        # Node ID
-            (index >> 8) & 0xFF, index & 0xFF,  # Object Index 
-            sub_index,   # Sub Index
-            0x00, 0x00,  # Starting Address
-            0x00,        # SDO Object
-            size,        # Byte count
-        ])
-        
-        # Add value in little endian format
-        value_bytes = bytearray()
-        for i in range(size):
-            value_bytes.append((value >> (8*i)) & 0xFF)
-        
-        packet.extend(value_bytes)
+        packet = build_write_packet(index, sub_index, value, size)
         
-        print(f"Writing object 0x{index:04X}:{sub_index} with value {value} (0x{value:X})")
-        print_packet(packet, True)
-        sock.send(packet)
+        logger.debug("Writing object 0x%04X:%d with value %d (0x%X)", index, sub_index, value, value)
+        send_packet(sock, packet)
         
-        response = sock.recv(1024)
-        print_packet(response, False)
+        response = recv_transaction(sock, sock.tx_id)
         
         if response[7] & 0x80:
             print(f"ERROR: Failed to write object 0x{index:04X}:{sub_index}")
             return False
             
-        print(f"Object 0x{index:04X}:{sub_index} written with value {value}")
+        logger.debug("Object 0x%04X:%d written with value %d", index, sub_index, value)
         return True
             
     except Exception as e:
         print(f"Error writing object: {e}")
         return False
 
+def batch_write_objects(sock, items):
+    """Write several CANopen objects in one burst; items are (index, sub_index, value, size)"""
+    for index, sub_index, value, size in items:
+        invalidate(sock, index)
+    try:
+        if logger.isEnabledFor(logging.DEBUG):
+            for index, sub_index, value, size in items:
+                logger.debug(f"Writing object 0x{index:04X}:{sub_index} with value {value} (0x{value:X})")
+        
+        responses = submit_linked(sock, [build_write_packet(*item) for item in items])
+        
+        for (index, sub_index, value, size), response in zip(items, responses):
+            if response[7] & 0x80:
+                print(f"ERROR: Failed to write object 0x{index:04X}:{sub_index}")
+                return False
+            logger.debug("Object 0x%04X:%d written with value %d", index, sub_index, value)
+        return True
+            
+    except Exception as e:
+        print(f"Error writing objects: {e}")
+        return False
+
 def read_object(sock, index, sub_index, size):
     """Read from a CANopen object"""
     try:
         # Format according to manual
-        packet = bytearray([
-            0x00, 0x0F,  # Transaction ID
-            0x00, 0x00,  # Protocol ID
-            0x00, 0x0D,  # Length
-            0x00,        # Unit ID
-            0x2B,        # Function code
-            0x0D,        # MEI type
-            0x00,        # Protocol option (0=read)
-            0x00,        # Reserved
-            0x00,        # Node ID
-            (index >> 8) & 0xFF, index & 0xFF,  # Object Index
-            sub_index,   # Sub Index
-            0x00, 0x00,  # Starting Address
-            0x00,        # SDO Object
-            size         # Byte count
-        ])
+        packet = build_read_packet(index, sub_index, size)
         
-        print(f"Reading object 0x{index:04X}:{sub_index}")
-        print_packet(packet, True)
-        sock.send(packet)
+        logger.debug("Reading object 0x%04X:%d", index, sub_index)
+        send_packet(sock, packet)
         
-        response = sock.recv(1024)
-        print_packet(response, False)
+        response = recv_transaction(sock, sock.tx_id)
         
         # Check for response
-        if len(response) >= 19 + size:
-            value = 0
-            for i in range(size):
-                value |= response[19 + i] << (8 * i)
-            
-            print(f"Object 0x{index:04X}:{sub_index} value: {value} (0x{value:X})")
+        value = parse_response(response, size)
+        if value is not None:
+            logger.debug("Object 0x%04X:%d value: %d (0x%X)", index, sub_index, value, value)
             return value
         else:
             print(f"Response too short when reading object 0x{index:04X}:{sub_index}")
@@ -538,17 +551,47 @@ def read_object(sock, index, sub_index, size):
         print(f"Error reading object: {e}")
         return None
 
+def read_object_cached(sock, index, sub_index, size, ttl=None):
+    """Read a CANopen object, reusing the cached value while it is still valid"""
+    if ttl is None:
+        ttl = OBJECT_CACHE_TTL.get(index, 0)
+    
+    key = (index, sub_index)
+    now = time.monotonic()
+    cached = sock.object_cache.get(key)
+    if cached is not None and now < cached[1]:
+        logger.debug("Object 0x%04X:%d value: %d (0x%X) [cached]", index, sub_index, cached[0], cached[0])
+        return cached[0]
+    
+    value = read_object(sock, index, sub_index, size)
+    if value is not None and ttl > 0:
+        sock.object_cache[key] = (value, now + ttl)
+    return value
+
+def invalidate(sock, index):
+    """Drop cached values of an object and of the objects depending on it"""
+    indices = (index,) + CACHE_DEPENDENTS.get(index, ())
+    for key in [key for key in sock.object_cache if key[0] in indices]:
+        del sock.object_cache[key]
+
 def go_through_state_machine(sock, name="Controller"):
     """Go through the state machine to reach 'Operation Enabled' state"""
     # First check current status
     print(f"\n=== Starting state machine sequence for {name} ===")
     
     print("\nReading initial statusword...")
+    previous_state, sock.last_state = sock.last_state, None
     status = read_statusword(sock)
     if status is None:
         print("Failed to read statusword - aborting state machine")
         return False
     
+    # Fast path: still enabled since the last walk on this connection
+    if previous_state == STATE_OPERATION_ENABLED and (status & 0x006F) == 0x0027:
+        print("Controller is still in 'Operation Enabled' state")
+        sock.last_state = STATE_OPERATION_ENABLED
+        return True
+    
     # Check if DI7 (Enable) is set
     if not (status & 0x0200):
         print("\n!!! WARNING: DI7 (Enable) is not set high. Motors cannot be powered !!!")
@@ -556,19 +599,7 @@ def go_through_state_machine(sock, name="Controller"):
         print("Continuing with state machine, but motor will not move without DI7 set")
     
     # Check current state and decide next step
-    state = STATE_UNKNOWN
-    if (status & 0x004F) == 0x0000:
-        state = STATE_NOT_READY
-    elif (status & 0x004F) == 0x0040:
-        state = STATE_SWITCH_ON_DISABLED
-    elif (status & 0x006F) == 0x0021:
-        state = STATE_READY_TO_SWITCH_ON
-    elif (status & 0x006F) == 0x0023:
-        state = STATE_SWITCHED_ON
-    elif (status & 0x006F) == 0x0027:
-        state = STATE_OPERATION_ENABLED
-    elif (status & 0x004F) == 0x0008:
-        state = STATE_FAULT
+    state, _ = classify_statusword(status)
     
     print(f"Current state: {STATE_NAMES.get(state, 'Unknown')}")
     
@@ -646,11 +677,131 @@ def go_through_state_machine(sock, name="Controller"):
     
     if state == STATE_OPERATION_ENABLED:
         print("\nController is now in 'Operation Enabled' state and ready for commands")
+        sock.last_state = state
         return True
     else:
         print(f"\nFailed to reach 'Operation Enabled' state, stopped in {STATE_NAMES.get(state, 'Unknown')}")
         return False
 
+class PollScheduler:
+    """Paces the movement polls of one connection.
+    
+    The statusword poll (high priority) runs on every cycle, the position read
+    (low priority) only while the gateway answers quickly. Exception responses
+    double the gap between requests, accepted requests shrink it again.
+    """
+    def __init__(self, sock, min_inter_request_ms=MIN_INTER_REQUEST_MS):
+        self.sock = sock
+        self.min_gap = min_inter_request_ms / 1000
+        self.gap = self.min_gap
+        self.last_request = 0
+        self.last_high_duration = 0
+    
+    def _pace(self):
+        wait = self.last_request + self.gap - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+    
+    def _adapt(self, rejected):
+        if rejected:
+            self.gap = max(self.gap * 2, BACKOFF_MIN_GAP)
+        elif self.gap > self.min_gap:
+            self.gap = max(self.gap - BACKOFF_STEP, self.min_gap)
+    
+    def _run(self, request, *args):
+        self._pace()
+        exceptions = self.sock.exception_responses
+        start = time.monotonic()
+        result = request(self.sock, *args)
+        self.last_request = time.monotonic()
+        
+        self._adapt(self.sock.exception_responses != exceptions)
+        return result, self.last_request - start
+    
+    def poll_high(self, request, *args):
+        """Run a high priority request"""
+        result, self.last_high_duration = self._run(request, *args)
+        return result
+    
+    def poll_low(self, request, *args):
+        """Send a low priority request, or skip it (None) if the gateway is slow.
+        Its reply is collected later with collect_low()."""
+        if self.last_high_duration >= SLOW_POLL_THRESHOLD:
+            return None
+        self._pace()
+        result = request(self.sock, *args)
+        self.last_request = time.monotonic()
+        return result
+    
+    def collect_low(self, receive, *args):
+        """Collect the reply to a request sent by poll_low(), backing off if it was rejected"""
+        exceptions = self.sock.exception_responses
+        result = receive(self.sock, *args)
+        self._adapt(self.sock.exception_responses != exceptions)
+        return result
+
+def request_position(sock):
+    """Send a read of the actual position (object 6064h) without waiting for the
+    reply; returns the transaction ID to collect it with receive_position()"""
+    try:
+        send_packet(sock, PKT_READ_POSITION)
+        return sock.tx_id
+    except Exception as e:
+        print(f"Error reading object: {e}")
+        return None
+
+def receive_position(sock, tx_id):
+    """Collect the reply to a position read sent by request_position()"""
+    try:
+        current_pos = parse_response(recv_matching(sock, tx_id), 4)
+        if current_pos is not None:
+            logger.debug("Current position: %d", current_pos)
+        return current_pos
+    except Exception as e:
+        print(f"Error reading object: {e}")
+        return None
+
+def wait_for_movement(sock, description):
+    """Poll the statusword until the target is reached or MOVE_TIMEOUT expires"""
+    scheduler = PollScheduler(sock)
+    position_tx_id = None  # Position read still in flight
+    start = time.monotonic()
+    deadline = start + MOVE_TIMEOUT
+    while time.monotonic() < deadline:
+        if position_tx_id is not None:
+            scheduler.collect_low(receive_position, position_tx_id)
+            position_tx_id = None
+        
+        logger.debug("Checking status, %.2fs elapsed...", time.monotonic() - start)
+        status = scheduler.poll_high(read_statusword)
+        
+        if status is None:
+            print("Failed to read status")
+        # Check target reached bit
+        elif status & 0x0400:
+            print(f"{description} completed successfully!")
+            return True
+        # Check if controller is still enabled
+        elif (status & 0x006F) != 0x0027:
+            print(f"Controller left Operation Enabled state during {description.lower()}")
+            return False
+        else:
+            # Read current position for progress tracking; the request goes
+            # out now and its reply is collected while yielding below
+            position_tx_id = scheduler.poll_low(request_position)
+        
+        # Yield briefly instead of sleeping a fixed second between reads,
+        # picking up the position reply as soon as it arrives
+        cycle_end = time.monotonic() + POLL_INTERVAL
+        if position_tx_id is not None and select.select([sock], [], [], POLL_INTERVAL)[0]:
+            scheduler.collect_low(receive_position, position_tx_id)
+            position_tx_id = None
+        select.select([sock], [], [], max(cycle_end - time.monotonic(), 0))
+    
+    if position_tx_id is not None:
+        scheduler.collect_low(receive_position, position_tx_id)
+    return False
+
 def test_simple_movement(sock, name="Controller"):
     """Test a simple movement in Profile Position mode with detailed feedback"""
     print(f"\n=== Starting test movement for {name} ===")
@@ -661,10 +812,11 @@ def test_simple_movement(sock, name="Controller"):
     if current_pos is None:
         print("Failed to read current position")
         return False
+    print(f"Current position: {current_pos}")
     
     # Read mode of operation display
     print("\nChecking current operation mode...")
-    op_mode = read_object(sock, 0x6061, 0, 1)  # Modes of Operation Display
+    op_mode = read_object_cached(sock, 0x6061, 0, 1)  # Modes of Operation Display
     if op_mode is None:
         print("Failed to read operation mode")
         return False
@@ -678,7 +830,7 @@ def test_simple_movement(sock, name="Controller"):
             
         # Verify operation mode change
         time.sleep(0.5)
-        op_mode = read_object(sock, 0x6061, 0, 1)
+        op_mode = read_object_cached(sock, 0x6061, 0, 1)
         if op_mode != 1:
             print(f"Operation mode didn't change to Profile Position (current mode: {op_mode})")
             return False
@@ -694,32 +846,25 @@ def test_simple_movement(sock, name="Controller"):
     
     # Set some key parameters
     print("\nReading feed constant...")
-    feed_constant = read_object(sock, 0x6092, 1, 4)  # Feed constant (feed)
+    feed_constant = read_object_cached(sock, 0x6092, 1, 4)  # Feed constant (feed)
     if feed_constant is None:
         print("Failed to read feed constant, using default value of 1000")
         feed_constant = 1000
     else:
         print(f"Feed constant: {feed_constant}")
     
-    # Set target position (1000 increments)
+    # Set target position (1000 increments), profile velocity and profile acceleration
     target_position = 1000
-    print(f"\nSetting target position to {target_position}...")
-    if not write_object(sock, 0x607A, 0, target_position, 4):
-        print("Failed to set target position")
-        return False
-    
-    # Set profile velocity
     velocity = 1000
-    print(f"\nSetting profile velocity to {velocity}...")
-    if not write_object(sock, 0x6081, 0, velocity, 4):
-        print("Failed to set profile velocity")
-        return False
-    
-    # Set profile acceleration
     acceleration = 2000
-    print(f"\nSetting profile acceleration to {acceleration}...")
-    if not write_object(sock, 0x6083, 0, acceleration, 4):
-        print("Failed to set profile acceleration")
+    print(f"\nSetting target position to {target_position}, profile velocity to {velocity}"
+          f" and profile acceleration to {acceleration}...")
+    if not batch_write_objects(sock, [
+        (0x607A, 0, target_position, 4),
+        (0x6081, 0, velocity, 4),
+        (0x6083, 0, acceleration, 4)
+    ]):
+        print("Failed to set movement parameters")
         return False
     
     # Start the movement (bit 4 set to 1)
@@ -730,82 +875,24 @@ def test_simple_movement(sock, name="Controller"):
     
     # Wait for movement to complete
     print("\nWaiting for movement to complete...")
-    movement_completed = False
-    for i in range(20):  # Longer timeout
-        print(f"Checking status, attempt {i+1}/20...")
-        status = read_statusword(sock)
-        
-        if status is None:
-            print("Failed to read status")
-            time.sleep(1)
-            continue
-            
-        # Check target reached bit
-        if status & 0x0400:
-            print("Movement completed successfully!")
-            movement_completed = True
-            break
-            
-        # Check if controller is still enabled
-        if (status & 0x006F) != 0x0027:
-            print("Controller left Operation Enabled state during movement")
-            break
-            
-        # Read current position for progress tracking
-        current_pos = read_object(sock, 0x6064, 0, 4)
-        if current_pos is not None:
-            print(f"Current position: {current_pos}")
-            
-        time.sleep(1)
+    movement_completed = wait_for_movement(sock, "Movement")
     
     if not movement_completed:
         print("Movement did not complete in the expected time")
         
-    # Reset the start bit
-    print("\nResetting start bit...")
-    write_controlword(sock, 0x000F)
-    
-    # Return to start position
-    print("\nSetting target position to 0...")
-    if not write_object(sock, 0x607A, 0, 0, 4):
-        print("Failed to set return position")
-        return False
-    
-    # Start the movement
-    print("\nReturning to start position...")
-    if not write_controlword(sock, 0x001F):
+    # Reset the start bit, set target position to 0 and start the return movement
+    print("\nResetting start bit and returning to start position...")
+    if not batch_write_objects(sock, [
+        (0x6040, 0, 0x000F, 2),
+        (0x607A, 0, 0, 4),
+        (0x6040, 0, 0x001F, 2)
+    ]):
         print("Failed to start return movement")
         return False
     
     # Wait for movement to complete
     print("\nWaiting for return movement to complete...")
-    return_completed = False
-    for i in range(20):  # Longer timeout
-        print(f"Checking status, attempt {i+1}/20...")
-        status = read_statusword(sock)
-        
-        if status is None:
-            print("Failed to read status")
-            time.sleep(1)
-            continue
-            
-        # Check target reached bit
-        if status & 0x0400:
-            print("Return movement completed successfully!")
-            return_completed = True
-            break
-            
-        # Check if controller is still enabled
-        if (status & 0x006F) != 0x0027:
-            print("Controller left Operation Enabled state during return movement")
-            break
-            
-        # Read current position for progress tracking
-        current_pos = read_object(sock, 0x6064, 0, 4)
-        if current_pos is not None:
-            print(f"Current position: {current_pos}")
-            
-        time.sleep(1)
+    return_completed = wait_for_movement(sock, "Return movement")
     
     if not return_completed:
         print("Return movement did not complete in the expected time")
@@ -819,16 +906,16 @@ def test_simple_movement(sock, name="Controller"):
 def check_modbus_gateway_setting(sock):
     """Check if Modbus TCP Gateway is properly configured"""
     print("\n=== Checking Controller Configuration ===")
+    sock.settimeout(DIAGNOSTIC_TIMEOUT)
     
     # First, try a simple Modbus read to see what kind of response we get
     print("\nSending test read request...")
     test_packet = build_read_packet(0x6041, 0, 2)  # Try to read statusword
     print_packet(test_packet, True)
-    sock.send(test_packet)
+    sock.sendall(test_packet)
     
     try:
-        response = sock.recv(1024)
-        print_packet(response, False)
+        response = recv_packet(sock)
         
         if len(response) >= 8 and response[7] == 0x2B + 0x80:  # Error in function code
             print("\n!!! PROTOCOL ERROR DETECTED !!!")
@@ -841,22 +928,11 @@ def check_modbus_gateway_setting(sock):
             
             # Let's try a standard Modbus read register to see if that works
             print("\nTrying standard Modbus read register function...")
-            std_packet = bytearray([
-                0x00, 0x01,  # Transaction ID
-                0x00, 0x00,  # Protocol ID
-                0x00, 0x06,  # Length
-                0x01,        # Unit ID
-                0x03,        # Function code: Read Holding Registers
-                0x00, 0x00,  # Starting address
-                0x00, 0x01   # Quantity of registers
-            ])
-            
-            print_packet(std_packet, True)
-            sock.send(std_packet)
+            print_packet(PKT_READ_HOLDING_REGISTER, True)
+            sock.sendall(PKT_READ_HOLDING_REGISTER)
             
             try:
-                std_response = sock.recv(1024)
-                print_packet(std_response, False)
+                std_response = recv_packet(sock)
                 
                 if len(std_response) >= 8 and std_response[7] == 0x03:
                     print("\nStandard Modbus read register works, but Modbus TCP Gateway doesn't.")
@@ -885,7 +961,7 @@ def check_modbus_gateway_setting(sock):
                 if response[18] == 2:  # Statusword is 2 bytes
                     statusword = response[19] | (response[20] << 8)
                     print(f"Statusword: 0x{statusword:04X}")
-                    print(decode_statusword(statusword))
+                    print(format_statusword(statusword))
                     
                     # Check if DI7 (Enable) is set
                     if not (statusword & 0x0200):
@@ -904,6 +980,26 @@ def check_modbus_gateway_setting(sock):
     print("\nModbus TCP Gateway test inconclusive. Try manually checking the web interface.")
     return False
 
+def run_axis(ip_address, name):
+    """Connect to one controller, enable it and run the test movement"""
+    sock = get_sock(ip_address)
+    if not sock:
+        return False
+    
+    if not go_through_state_machine(sock, name):
+        return False
+    return test_simple_movement(sock, name)
+
+async def run_axes_concurrently():
+    """Drive the Y and Z controllers at the same time from one event loop"""
+    # The socket helpers are blocking and shared with the diagnostics above,
+    # so each axis gets a worker thread; the two controllers share no state.
+    results = await asyncio.gather(
+        asyncio.to_thread(run_axis, Y_CONTROLLER_IP, "Y-axis"),
+        asyncio.to_thread(run_axis, Z_CONTROLLER_IP, "Z-axis")
+    )
+    return all(results)
+
 def main():
     while True:
         print("\n========== Motor Controller Test Menu ==========")
@@ -914,10 +1010,13 @@ def main():
         print("5) Reset controllers to factory settings")
         print("6) Test state machine on Y-axis")
         print("7) Test state machine on Z-axis")
-        print("8) Exit")
+        print("8) Test movement on both axes concurrently")
+        print("9) Exit")
         
-        choice = input("Enter your choice (1-8): ")
+        choice = input("Enter your choice (1-9): ")
         
+        # The diagnostics send raw frames with fixed transaction IDs, so they run on a
+        # throwaway connection rather than leave stray responses on the pooled one
         if choice == '1':
             y_sock = create_connection(Y_CONTROLLER_IP)
             if y_sock:
@@ -970,29 +1069,32 @@ def main():
                 print("\nReset cancelled.")
                 
         elif choice == '6':
-            y_sock = create_connection(Y_CONTROLLER_IP)
+            y_sock = get_sock(Y_CONTROLLER_IP)
             if y_sock:
-                try:
-                    print("\n--- Testing state machine on Y-axis ---")
-                    go_through_state_machine(y_sock, "Y-axis")
-                finally:
-                    y_sock.close()
+                print("\n--- Testing state machine on Y-axis ---")
+                go_through_state_machine(y_sock, "Y-axis")
                     
         elif choice == '7':
-            z_sock = create_connection(Z_CONTROLLER_IP)
+            z_sock = get_sock(Z_CONTROLLER_IP)
             if z_sock:
-                try:
-                    print("\n--- Testing state machine on Z-axis ---")
-                    go_through_state_machine(z_sock, "Z-axis")
-                finally:
-                    z_sock.close()
+                print("\n--- Testing state machine on Z-axis ---")
+                go_through_state_machine(z_sock, "Z-axis")
                     
         elif choice == '8':
+            print("\n--- Testing movement on Y and Z axes concurrently ---")
+            if asyncio.run(run_axes_concurrently()):
+                print("\nBoth axes completed the test movement")
+            else:
+                print("\nTest movement failed on at least one axis")
+                    
+        elif choice == '9':
             print("Exiting...")
             sys.exit(0)
             
         else:
-            print("Invalid choice. Please enter a number between 1 and 8.")
+            print("Invalid choice. Please enter a number between 1 and 9.")
 
 if __name__ == "__main__":
+    if "--verbose" in sys.argv[1:]:
+        logger.setLevel(logging.DEBUG)
     main()
@@ -0,0 +1,216 @@
+"""
+Packet encoding and decoding for the dryve D1 Modbus TCP Gateway.
+
+Pure functions shared by the test scripts, plus the few socket helpers they
+have in common (at the end). The module is plain Python so it runs unchanged
+under PyPy and can be compiled in place with `cythonize -i packet_codec.py`
+when the per-packet cost matters.
+"""
+
+import select
+import socket
+import struct
+import sys
+
+# Define state machine states for better tracking
+STATE_NOT_READY = 0
+STATE_SWITCH_ON_DISABLED = 1
+STATE_READY_TO_SWITCH_ON = 2
+STATE_SWITCHED_ON = 3
+STATE_OPERATION_ENABLED = 4
+STATE_FAULT = 5
+STATE_UNKNOWN = 6
+
+STATE_NAMES = {
+    STATE_NOT_READY: "Not Ready to Switch On",
+    STATE_SWITCH_ON_DISABLED: "Switch On Disabled",
+    STATE_READY_TO_SWITCH_ON: "Ready to Switch On",
+    STATE_SWITCHED_ON: "Switched On",
+    STATE_OPERATION_ENABLED: "Operation Enabled",
+    STATE_FAULT: "Fault",
+    STATE_UNKNOWN: "Unknown State"
+}
+
+# Modbus TCP Gateway request header (section 6.6.5 of the manual):
+# Transaction ID, Protocol ID, Length, Unit ID, Function code, MEI type,
+# Protocol option, Reserved, Node ID, Object Index, Sub Index,
+# Starting Address, SDO Object, Byte count
+SDO_HEADER = struct.Struct(">HHHBBBBBBHBHBB")
+
+# Little endian object values in a gateway response, by byte count
+OBJECT_VALUE = {1: struct.Struct("<B"), 2: struct.Struct("<H"), 4: struct.Struct("<I")}
+
+def build_read_packet(index, sub_index, size):
+    """Create a correctly formatted Modbus TCP Gateway read packet"""
+    packet = bytearray(SDO_HEADER.size)
+    SDO_HEADER.pack_into(packet, 0,
+                         0x000F, 0x0000, 0x0D,    # Transaction ID, Protocol ID, Length
+                         0x00, 0x2B, 0x0D,        # Unit ID, Function code, MEI type
+                         0x00, 0x00, 0x00,        # Protocol option (0=read), Reserved, Node ID
+                         index, sub_index,        # Object Index, Sub Index
+                         0x0000, 0x00, size)      # Starting Address, SDO Object, Byte count
+    return packet
+
+def build_write_packet(index, sub_index, value, size):
+    """Create a correctly formatted Modbus TCP Gateway write packet"""
+    packet = bytearray(SDO_HEADER.size + size)
+    SDO_HEADER.pack_into(packet, 0,
+                         0x000F, 0x0000, 0x0D + size,  # Length (13 + data size)
+                         0x00, 0x2B, 0x0D,
+                         0x01, 0x00, 0x00,             # Protocol option (1=write)
+                         index, sub_index,
+                         0x0000, 0x00, size)
+    
+    # Add value in little endian format
+    packet[SDO_HEADER.size:] = (value & ((1 << (8 * size)) - 1)).to_bytes(size, 'little')
+    return packet
+
+def parse_response(response, size):
+    """Extract the object value (bytes 19+, little endian) from a gateway read response"""
+    if len(response) < 19 + size:
+        return None
+    return OBJECT_VALUE[size].unpack_from(response, 19)[0]
+
+# Big endian MBAP header words: Transaction ID (bytes 0-1) and Length (bytes 4-5)
+MBAP_WORD = struct.Struct(">H")
+
+def frame_at(buffer, start, end):
+    """Return (transaction ID, size) of the Modbus TCP frame at buffer[start] once all
+    of it is within buffer[start:end], None while it is incomplete"""
+    if end - start < 6:
+        return None
+    size = 6 + MBAP_WORD.unpack_from(buffer, start + 4)[0]
+    if end - start < size:
+        return None
+    return MBAP_WORD.unpack_from(buffer, start)[0], size
+
+def _state_from_bits(statusword):
+    """Map the state bits of a statusword to a drive state (Section 6.5.10 of manual)"""
+    if (statusword & 0x004F) == 0x0000:  # xxxx xxxx x0xx 0000
+        return STATE_NOT_READY
+    elif (statusword & 0x004F) == 0x0040:  # xxxx xxxx x1xx 0000
+        return STATE_SWITCH_ON_DISABLED
+    elif (statusword & 0x006F) == 0x0021:  # xxxx xxxx x01x 0001
+        return STATE_READY_TO_SWITCH_ON
+    elif (statusword & 0x006F) == 0x0023:  # xxxx xxxx x01x 0011
+        return STATE_SWITCHED_ON
+    elif (statusword & 0x006F) == 0x0027:  # xxxx xxxx x01x 0111
+        return STATE_OPERATION_ENABLED
+    elif (statusword & 0x004F) == 0x0008:  # xxxx xxxx x0xx 1000
+        return STATE_FAULT
+    return STATE_UNKNOWN
+
+# All state masks are subsets of 0x006F, so the state is a table lookup
+STATE_BITS_MASK = 0x006F
+STATE_TABLE = [_state_from_bits(bits) for bits in range(STATE_BITS_MASK + 1)]
+
+# Warning, Remote (DI7), Target Reached, Internal Limit Active
+STATUS_FLAGS_MASK = 0x0E80
+
+def classify_statusword(statusword):
+    """Split a statusword into its drive state and additional flag bits"""
+    return STATE_TABLE[statusword & STATE_BITS_MASK], statusword & STATUS_FLAGS_MASK
+
+# Flag bit, text when set, text when clear - in the order they are reported
+_STATUS_LABELS = (
+    (0x0080, ", Warning", ""),
+    (0x0400, ", Target Reached", ""),
+    (0x0200, ", Remote (DI7=1)", ", NOT Remote (DI7=0) - ENABLE IS OFF!"),
+    (0x0800, ", Internal Limit Active", ""),
+)
+
+def _flags_text(flags):
+    """Describe the additional flag bits of a statusword"""
+    return "".join(on if flags & mask else off for mask, on, off in _STATUS_LABELS)
+
+# Only 16 flag combinations exist, so their descriptions are built once
+STATUS_FLAGS_TEXT = {flags: _flags_text(flags)
+                     for flags in range(STATUS_FLAGS_MASK + 1) if flags & ~STATUS_FLAGS_MASK == 0}
+
+def format_statusword(statusword):
+    """Decode statusword to human-readable state based on Section 6.5.10 of manual"""
+    state, flags = classify_statusword(statusword)
+    
+    description = STATE_NAMES.get(state, "Unknown State")
+    return f"State: {description} (0x{statusword:04X}){STATUS_FLAGS_TEXT[flags]}"
+
+def interpret_controlword(value):
+    """Translate controlword bits to human-readable form"""
+    result = []
+    
+    if value & 0x0001:
+        result.append("Switch On")
+    if value & 0x0002:
+        result.append("Enable Voltage")
+    if value & 0x0004:
+        result.append("Quick-Stop")
+    if value & 0x0008:
+        result.append("Enable Operation")
+    if value & 0x0010:
+        result.append("Start/Homing")
+    if value & 0x0020:
+        result.append("Apply Parameters")
+    if value & 0x0040:
+        result.append("Relative/Absolute")
+    if value & 0x0080:
+        result.append("Fault Reset")
+    if value & 0x0100:
+        result.append("Halt")
+    
+    return ", ".join(result)
+
+# Socket helpers shared by the test scripts
+
+MAX_ADU_SIZE = 260  # Largest possible Modbus TCP frame (MBAP header + PDU)
+SOCKET_BUFFER_SIZE = 4096  # Kernel send/receive buffer size in bytes
+
+# IPPROTO_TCP keepalive options (where the platform supports them): probe after
+# 1 s idle, every second, 3 times, so a dead controller is reported by the OS
+# within seconds instead of stalling every blocked call
+TCP_KEEPALIVE_OPTIONS = (
+    ("TCP_KEEPIDLE", 1),
+    ("TCP_KEEPINTVL", 1),
+    ("TCP_KEEPCNT", 3)
+)
+
+def set_buffer_sizes(sock, size=SOCKET_BUFFER_SIZE):
+    """Shrink the kernel send/receive buffers; every frame is at most MAX_ADU_SIZE
+    bytes, so small ones are plenty. Call before connecting so the receive window
+    is advertised accordingly."""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+
+def enable_keepalive(sock, options=TCP_KEEPALIVE_OPTIONS):
+    """Let the OS detect a dead link, with the given IPPROTO_TCP options
+    (the ones the platform does not support are skipped)"""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for name, value in options:
+        if hasattr(socket, name):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+
+def report(sock, message):
+    """Print a message about one controller, labelled with its axis name (leading
+    line breaks stay in front of the label). The text is written in one call, so
+    lines from axes tested concurrently do not run together."""
+    text = message.lstrip("\n")
+    label = f"[{sock.name}] " if sock.name else ""
+    sys.stdout.write(f"{message[:len(message) - len(text)]}{label}{text}\n")
+
+def recv_exact(sock, view):
+    """Fill the given memoryview completely from the socket"""
+    received = 0
+    while received < len(view):
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Connection closed by controller")
+        received += count
+
+def is_alive(sock):
+    """Discard stale bytes on an open connection and check that it is still open"""
+    try:
+        while select.select([sock], [], [], 0)[0]:
+            if not sock.recv(MAX_ADU_SIZE):
+                return False  # Closed by the controller
+        return True
+    except OSError:
+        return False
@@ -1,243 +1,443 @@
+import asyncio
+import itertools
+import select
+import socket
 import time
 import struct
-from pymodbus.client import ModbusTcpClient
-from pymodbus.constants import Endian
-from pymodbus.payload import BinaryPayloadBuilder
+
+from packet_codec import MAX_ADU_SIZE, recv_exact, report, set_buffer_sizes
 
 # Motor controller IP addresses
 Y_CONTROLLER_IP = "169.254.239.1"
 Z_CONTROLLER_IP = "169.254.239.2"
 MODBUS_PORT = 502  # Default Modbus TCP port
+SOCKET_TIMEOUT = 3  # Seconds, same default pymodbus used for connect and receive
 
-def create_modbus_client(ip_address):
-    """Create and connect to a Modbus TCP client"""
-    client = ModbusTcpClient(ip_address, port=MODBUS_PORT)
-    if client.connect():
-        print(f"Connected to controller at {ip_address}")
-        return client
-    else:
-        print(f"Failed to connect to controller at {ip_address}")
-        return None
+# Modbus TCP Gateway request header (section 6.6.5 of the manual):
+# Transaction ID, Protocol ID, Length, Unit ID, Function Code, MEI Type,
+# Protocol control, Reserved, Node ID, Object index, Sub index,
+# Starting address, SDO object, Byte count
+SDO_HEADER_FORMAT = '>HHHBBBBBBHBHBB'
+_HDR_STRUCT = struct.Struct(SDO_HEADER_FORMAT)
 
-def read_statusword(client):
-    """Read the statusword (object 6041h) to get controller status"""
+# Little endian encoders for the value of a write request, by byte count
+_PAYLOAD_ENC = {1: struct.Struct('<B').pack, 2: struct.Struct('<H').pack, 4: struct.Struct('<I').pack}
+
+# Complete write requests (header + value bytes), packed in one call, by byte count
+_WRITE_STRUCTS = {size: struct.Struct(f'{SDO_HEADER_FORMAT}{size}s') for size in _PAYLOAD_ENC}
+
+# Requests with constant fields, built once at import
+_READ_STATUSWORD_TEMPLATE = _HDR_STRUCT.pack(0,       # Transaction ID
+                                             0,       # Protocol ID
+                                             13,      # Length
+                                             0,       # Unit ID
+                                             43,      # Function Code (2Bh)
+                                             13,      # MEI Type (0Dh)
+                                             0,       # Protocol control (read)
+                                             0,       # Reserved
+                                             0,       # Node ID
+                                             0x6041,  # Object index (6041h)
+                                             0,       # Sub index
+                                             0,       # Starting address
+                                             0,       # SDO object
+                                             2)       # Byte count
+
+_WRITE_CONTROLWORD_TEMPLATE = _HDR_STRUCT.pack(0,       # Transaction ID
+                                               0,       # Protocol ID
+                                               15,      # Length
+                                               0,       # Unit ID
+                                               43,      # Function Code (2Bh)
+                                               13,      # MEI Type (0Dh)
+                                               1,       # Protocol control (write)
+                                               0,       # Reserved
+                                               0,       # Node ID
+                                               0x6040,  # Object index (6040h)
+                                               0,       # Sub index
+                                               0,       # Starting address
+                                               0,       # SDO object
+                                               2) + bytes(2)  # Byte count, value placeholder
+
+# Transaction IDs for outgoing requests, so each response can be matched to its request
+_txid = itertools.count(1)
+
+STATE_TIMEOUT = 1.0         # Seconds to wait for the drive to reach a new state
+STATE_POLL_INTERVAL = 0.01  # Seconds between statusword polls while waiting
+BURST_TIMEOUT = 0.05        # Seconds to wait for the back-to-back state machine commands
+MOVE_TIMEOUT = 5.0          # Seconds to wait for a movement to reach its target
+MOVE_POLL_INTERVAL = 0.05   # Seconds to wait for a statusword reply before polling again
+CONTROLWORD_CACHE_TTL = 2.0 # Seconds during which rewriting the same controlword is skipped
+
+# Operation Enabled (0x0027) with Remote (DI7) and Target Reached set
+_OP_ENABLED_MASK = 0x0627
+_OP_ENABLED_VAL = 0x0627
+
+class ModbusSocket(socket.socket):
+    """TCP socket with a receive buffer reused for every response on the connection"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rx_buf = bytearray(MAX_ADU_SIZE)
+        self.last_controlword = None  # (value, time) of the last acknowledged controlword
+        self.name = ""  # Axis name that labels the messages about this controller
+
+def create_connection(ip_address, name=""):
+    """Create and connect a TCP socket to the controller"""
+    sock = ModbusSocket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.name = name
     try:
-        # For Modbus TCP Gateway, we need to use raw message
-        # Reading CANopen object 6041h (Statusword)
-        request = struct.pack('>HHHBBBBHBBHH', 
-                              0,       # Transaction ID
-                              0,       # Protocol ID
-                              13,      # Length
-                              0,       # Unit ID
-                              43,      # Function Code (2Bh)
-                              13,      # MEI Type (0Dh)
-                              0,       # Protocol control (read)
-                              0,       # Reserved and Node ID
-                              0x6041,  # Object index (6041h)
-                              0,       # Sub index
-                              0,       # Starting address
-                              2)       # Byte count
+        sock.settimeout(SOCKET_TIMEOUT)
+        # Send each small request immediately instead of waiting for delayed ACKs
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        set_buffer_sizes(sock)
+        sock.connect((ip_address, MODBUS_PORT))
+        report(sock, f"Connected to controller at {ip_address}")
         
-        client.socket.send(request)
-        response = client.socket.recv(1024)
+        # The OS may round the sizes (Linux doubles them), so report what is in effect
+        report(sock, f"Socket buffers: send {sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)} bytes, "
+              f"receive {sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)} bytes")
+        return sock
+    except Exception as e:
+        report(sock, f"Failed to connect to controller at {ip_address}: {e}")
+        sock.close()
+        return None
+
+def next_txid():
+    """Return the next transaction ID (16 bits, wrapping around)"""
+    return next(_txid) & 0xFFFF
+
+def stamp_request(request):
+    """Put the next transaction ID into bytes 0-1 of a request; returns the ID"""
+    txid = next_txid()
+    struct.pack_into('>H', request, 0, txid)
+    return txid
+
+def recv_mbap(sock, txid=None):
+    """Receive exactly one Modbus TCP frame: the 6-byte MBAP header, then the
+    number of bytes announced in its length field (bytes 4-5). With a txid,
+    frames belonging to other transactions are discarded until it arrives.
+    The frame lives in the socket's receive buffer and is valid until the next receive."""
+    view = memoryview(sock.rx_buf)
+    while True:
+        recv_exact(sock, view[:6])
+        size = min(6 + struct.unpack_from('>H', view, 4)[0], MAX_ADU_SIZE)
+        recv_exact(sock, view[6:size])
         
-        # Check if response is valid
-        if len(response) >= 21:  # Header + data
-            # Extract statusword value (bytes 19-20, little endian)
-            status_value = struct.unpack('<H', response[19:21])[0]
-            print(f"Statusword: 0x{status_value:04X}")
+        received_txid = struct.unpack_from('>H', view, 0)[0]
+        if txid is None or received_txid == txid:
+            return view[:size]
+        report(sock, f"Discarding stale response to transaction 0x{received_txid:04X}")
+
+def read_statusword_quiet(sock):
+    """Read the statusword (object 6041h) without printing anything. Returns None
+    for an invalid response; socket errors are raised to the caller."""
+    # For Modbus TCP Gateway, we need to use raw message
+    # Reading CANopen object 6041h (Statusword)
+    request = bytearray(_READ_STATUSWORD_TEMPLATE)
+    txid = stamp_request(request)
+    
+    sock.sendall(request)
+    response = recv_mbap(sock, txid)
+    
+    # Check if response is valid
+    if len(response) < 21:  # Header + data
+        return None
+    # Extract statusword value (bytes 19-20, little endian)
+    return struct.unpack_from('<H', response, 19)[0]
+
+def read_statusword(sock):
+    """Read the statusword (object 6041h) to get controller status"""
+    try:
+        status_value = read_statusword_quiet(sock)
+        if status_value is not None:
+            report(sock, f"Statusword: 0x{status_value:04X}")
             return status_value
         else:
-            print("Invalid response length")
+            report(sock, "Invalid response length")
             return None
             
     except Exception as e:
-        print(f"Error reading statusword: {e}")
+        report(sock, f"Error reading statusword: {e}")
         return None
 
-def write_controlword(client, value):
-    """Write to the controlword (object 6040h) to control the drive"""
+def write_controlword(sock, value):
+    """Write to the controlword (object 6040h) to control the drive. The same value
+    acknowledged less than CONTROLWORD_CACHE_TTL ago is not written again."""
+    last = sock.last_controlword
+    if last is not None and last[0] == value and time.monotonic() - last[1] < CONTROLWORD_CACHE_TTL:
+        report(sock, f"Controlword already 0x{value:04X}, not written again")
+        return True
+    
+    sock.last_controlword = None
     try:
         # Writing CANopen object 6040h (Controlword)
-        request = struct.pack('>HHHBBBBHBBHH', 
-                              0,       # Transaction ID
-                              0,       # Protocol ID
-                              15,      # Length
-                              0,       # Unit ID
-                              43,      # Function Code (2Bh)
-                              13,      # MEI Type (0Dh)
-                              1,       # Protocol control (write)
-                              0,       # Reserved and Node ID
-                              0x6040,  # Object index (6040h)
-                              0,       # Sub index
-                              0,       # Starting address
-                              2)       # Byte count
-              
+        request = bytearray(_WRITE_CONTROLWORD_TEMPLATE)
+        
         # Add the value to write (little endian)
-        request += struct.pack('<H', value)
+        struct.pack_into('<H', request, 19, value)
+        txid = stamp_request(request)
         
-        client.socket.send(request)
-        response = client.socket.recv(1024)
+        sock.sendall(request)
+        response = recv_mbap(sock, txid)
         
         # Check if response is valid
         if len(response) >= 13:  # Header
-            print(f"Successfully wrote controlword: 0x{value:04X}")
+            report(sock, f"Successfully wrote controlword: 0x{value:04X}")
+            sock.last_controlword = (value, time.monotonic())
             return True
         else:
-            print("Invalid response length")
+            report(sock, "Invalid response length")
             return False
             
     except Exception as e:
-        print(f"Error writing controlword: {e}")
+        report(sock, f"Error writing controlword: {e}")
         return False
 
-def write_object(client, index, sub_index, value, size):
+def build_write_request(index, sub_index, value, size, txid=0):
+    """Build the request writing a CANopen object with the specified size"""
+    # Calculate proper message length based on data size
+    msg_length = 13 + size
+    
+    # Build header and value (little endian) in one buffer
+    request = _WRITE_STRUCTS[size].pack(txid,          # Transaction ID
+                                        0,             # Protocol ID
+                                        msg_length,    # Length
+                                        0,             # Unit ID
+                                        43,            # Function Code (2Bh)
+                                        13,            # MEI Type (0Dh)
+                                        1,             # Protocol control (write)
+                                        0,             # Reserved
+                                        0,             # Node ID
+                                        index,         # Object index
+                                        sub_index,     # Sub index
+                                        0,             # Starting address
+                                        0,             # SDO object
+                                        size,          # Byte count
+                                        _PAYLOAD_ENC[size](value))  # Value
+    
+    return request
+
+def write_object(sock, index, sub_index, value, size):
     """Write to a CANopen object with the specified size"""
     try:
-        # Calculate proper message length based on data size
-        msg_length = 13 + size
-        
-        # Build header
-        request = struct.pack('>HHHBBBBHBB', 
-                              0,             # Transaction ID
-                              0,             # Protocol ID
-                              msg_length,    # Length
-                              0,             # Unit ID
-                              43,            # Function Code (2Bh)
-                              13,            # MEI Type (0Dh)
-                              1,             # Protocol control (write)
-                              0,             # Reserved and Node ID
-                              index,         # Object index
-                              sub_index,     # Sub index
-                              0)             # Starting address
-                              
-        # Add the size
-        request += struct.pack('>H', size)
+        txid = next_txid()
+        request = build_write_request(index, sub_index, value, size, txid)
         
-        # Add the value to write in little endian format
-        if size == 1:
-            request += struct.pack('<B', value)
-        elif size == 2:
-            request += struct.pack('<H', value)
-        elif size == 4:
-            request += struct.pack('<I', value)
-        
-        client.socket.send(request)
-        response = client.socket.recv(1024)
+        sock.sendall(request)
+        response = recv_mbap(sock, txid)
         
         # Check if response is valid
         if len(response) >= 13:  # Header
-            print(f"Successfully wrote object 0x{index:04X}:{sub_index} with value {value}")
+            report(sock, f"Successfully wrote object 0x{index:04X}:{sub_index} with value {value}")
             return True
         else:
-            print("Invalid response length")
+            report(sock, "Invalid response length")
             return False
             
     except Exception as e:
-        print(f"Error writing object: {e}")
+        report(sock, f"Error writing object: {e}")
+        return False
+
+def write_objects_batch(sock, items):
+    """Write several CANopen objects, given as (index, sub_index, value, size), in one
+    burst: all requests go out in a single send, then the responses are read in order"""
+    try:
+        txids = [next_txid() for _ in items]
+        requests = b"".join(build_write_request(*item, txid) for item, txid in zip(items, txids))
+        sock.sendall(requests)
+        
+        for (index, sub_index, value, size), txid in zip(items, txids):
+            response = recv_mbap(sock, txid)
+            
+            # Check if response is valid
+            if len(response) < 13 or response[7] & 0x80:
+                report(sock, f"Failed to write object 0x{index:04X}:{sub_index}")
+                return False
+            report(sock, f"Successfully wrote object 0x{index:04X}:{sub_index} with value {value}")
+        return True
+            
+    except Exception as e:
+        report(sock, f"Error writing objects: {e}")
         return False
 
-def go_through_state_machine(client):
+def write_controlword_async(sock, value):
+    """Send a controlword write without waiting for its acknowledgement;
+    returns the transaction ID to collect it with drain_pending_acks()"""
+    request = bytearray(_WRITE_CONTROLWORD_TEMPLATE)
+    struct.pack_into('<H', request, 19, value)
+    txid = stamp_request(request)
+    sock.last_controlword = None  # Unknown until the acknowledgement is drained
+    sock.sendall(request)
+    report(sock, f"Sent controlword: 0x{value:04X}")
+    return txid
+
+def drain_pending_acks(sock, txids):
+    """Consume the acknowledgements of writes sent without waiting.
+    Returns False if any of them was rejected."""
+    accepted = True
+    for txid in txids:
+        response = recv_mbap(sock, txid)
+        if len(response) < 13 or response[7] & 0x80:
+            accepted = False
+    return accepted
+
+def poll_statusword(sock, mask, expected, timeout=STATE_TIMEOUT):
+    """Poll the statusword until (status & mask) == expected or the timeout
+    expires. Returns the last statusword read (printed once at the end)."""
+    deadline = time.monotonic() + timeout
+    try:
+        status = read_statusword_quiet(sock)
+        while (status is None or (status & mask) != expected) and time.monotonic() < deadline:
+            select.select([sock], [], [], STATE_POLL_INTERVAL)
+            status = read_statusword_quiet(sock)
+    except Exception as e:
+        report(sock, f"Error reading statusword: {e}")
+        return None
+    
+    if status is not None:
+        report(sock, f"Statusword: 0x{status:04X}")
+    return status
+
+def write_controlword_and_poll(sock, value, mask, expected, timeout=STATE_TIMEOUT):
+    """Write the controlword, then poll the statusword until (status & mask) == expected
+    or the timeout expires. Returns the last statusword read."""
+    if not write_controlword(sock, value):
+        return None
+    return poll_statusword(sock, mask, expected, timeout)
+
+def wait_for_target_reached(sock, timeout=MOVE_TIMEOUT):
+    """Poll the statusword until the target reached bit (bit 10) is set or the
+    timeout expires. The polls are not printed."""
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            status = read_statusword_quiet(sock)
+            if status is not None and status & 0x0400:  # Check target reached bit
+                return True
+            
+            # Not there yet: give the drive one poll interval, then ask again
+            select.select([sock], [], [], MOVE_POLL_INTERVAL)
+    except Exception as e:
+        report(sock, f"Error reading statusword: {e}")
+    return False
+
+# State machine commands towards 'Operation Enabled': controlword, name and
+# the state (statusword & 0x006F) the drive is in once it has been executed
+STATE_MACHINE_STEPS = (
+    (0x0006, "Shutdown", 0x0021),          # -> Ready to Switch On
+    (0x0007, "Switch On", 0x0023),         # -> Switched On
+    (0x000F, "Enable Operation", 0x0027)   # -> Operation Enabled
+)
+
+def go_through_state_machine(sock):
     """Go through the state machine to reach 'Operation Enabled' state"""
     # First check current status
-    status = read_statusword(client)
+    status = read_statusword(sock)
     if status is None:
         return False
     
-    # Command: Shutdown (prepare for switch on)
-    print("Sending 'Shutdown' command...")
-    write_controlword(client, 0x0006)
-    time.sleep(0.5)
-    status = read_statusword(client)
-    
-    # Command: Switch On
-    print("Sending 'Switch On' command...")
-    write_controlword(client, 0x0007)
-    time.sleep(0.5)
-    status = read_statusword(client)
+    # Commands: Shutdown -> Switch On -> Enable Operation, sent back to back.
+    # A drive that is quick enough processes them in order, so only the final state
+    # is checked - but only briefly, as drives ignore commands that arrive while
+    # the previous transition is still running.
+    report(sock, "Sending 'Shutdown', 'Switch On' and 'Enable Operation' commands...")
+    try:
+        txids = [write_controlword_async(sock, value) for value, _, _ in STATE_MACHINE_STEPS]
+        accepted = drain_pending_acks(sock, txids)
+    except Exception as e:
+        report(sock, f"Error writing controlword: {e}")
+        return False
+    if accepted:
+        status = poll_statusword(sock, 0x006F, 0x0027, BURST_TIMEOUT)
+    else:
+        # No point waiting for the final state; start from the one the drive is in
+        report(sock, "Controller rejected a command of the burst, sending them one at a time")
+        status = read_statusword(sock)
     
-    # Command: Enable Operation
-    print("Sending 'Enable Operation' command...")
-    write_controlword(client, 0x000F)
-    time.sleep(0.5)
-    status = read_statusword(client)
+    if status is None or (status & 0x006F) != 0x0027:
+        # Continue one command at a time from the state actually reached,
+        # waiting for each state
+        states = [state for _, _, state in STATE_MACHINE_STEPS]
+        current = None if status is None else status & 0x006F
+        first = states.index(current) + 1 if current in states else 0
+        for value, name, state in STATE_MACHINE_STEPS[first:]:
+            report(sock, f"Sending '{name}' command...")
+            status = write_controlword_and_poll(sock, value, 0x006F, state)
     
     # Check if we reached Operation Enabled state
-    if status & 0x0627 == 0x0627:  # Check relevant bits
-        print("Successfully reached 'Operation Enabled' state")
+    if status is not None and status & _OP_ENABLED_MASK == _OP_ENABLED_VAL:  # Check relevant bits
+        report(sock, "Successfully reached 'Operation Enabled' state")
         return True
     else:
-        print("Failed to reach 'Operation Enabled' state")
+        report(sock, "Failed to reach 'Operation Enabled' state")
         return False
 
-def test_simple_movement(client):
+def test_simple_movement(sock):
     """Test a simple movement in Profile Position mode"""
-    # Set operation mode to Profile Position (1)
-    print("Setting operation mode to Profile Position...")
-    write_object(client, 0x6060, 0, 1, 1)
-    time.sleep(0.5)
-    
-    # Set target position (1000 increments)
-    print("Setting target position to 1000...")
-    write_object(client, 0x607A, 0, 1000, 4)
-    time.sleep(0.5)
-    
-    # Set profile velocity (1000 units/sec)
-    print("Setting profile velocity to 1000...")
-    write_object(client, 0x6081, 0, 1000, 4)
-    time.sleep(0.5)
-    
-    # Set profile acceleration (2000 units/sec²)
-    print("Setting profile acceleration to 2000...")
-    write_object(client, 0x6083, 0, 2000, 4)
-    time.sleep(0.5)
+    # Set operation mode and movement parameters in one burst
+    report(sock, "Setting Profile Position mode, target position 1000, velocity 1000 and acceleration 2000...")
+    write_objects_batch(sock, [
+        (0x6060, 0, 1, 1),     # Operation mode: Profile Position (1)
+        (0x607A, 0, 1000, 4),  # Target position (1000 increments)
+        (0x6081, 0, 1000, 4),  # Profile velocity (1000 units/sec)
+        (0x6083, 0, 2000, 4)   # Profile acceleration (2000 units/sec²)
+    ])
     
     # Start the movement (bit 4 set to 1)
-    print("Starting movement...")
-    write_controlword(client, 0x001F)
+    report(sock, "Starting movement...")
+    write_controlword(sock, 0x001F)
     time.sleep(0.5)
     
     # Wait for movement to complete
-    print("Waiting for movement to complete...")
-    for _ in range(10):
-        status = read_statusword(client)
-        if status is not None and (status & 0x0400):  # Check target reached bit
-            print("Movement completed")
-            break
-        time.sleep(0.5)
+    report(sock, "Waiting for movement to complete...")
+    if wait_for_target_reached(sock):
+        report(sock, "Movement completed")
     
     # Reset the start bit
-    write_controlword(client, 0x000F)
+    write_controlword(sock, 0x000F)
     
     # Return to start position
     # Set target position (0 increments)
-    print("Setting target position to 0...")
-    write_object(client, 0x607A, 0, 0, 4)
+    report(sock, "Setting target position to 0...")
+    write_object(sock, 0x607A, 0, 0, 4)
     time.sleep(0.5)
     
     # Start the movement
-    print("Returning to start position...")
-    write_controlword(client, 0x001F)
+    report(sock, "Returning to start position...")
+    write_controlword(sock, 0x001F)
     time.sleep(0.5)
     
     # Wait for movement to complete
-    print("Waiting for return movement to complete...")
-    for _ in range(10):
-        status = read_statusword(client)
-        if status is not None and (status & 0x0400):  # Check target reached bit
-            print("Return movement completed")
-            break
-        time.sleep(0.5)
+    report(sock, "Waiting for return movement to complete...")
+    if wait_for_target_reached(sock):
+        report(sock, "Return movement completed")
     
     # Reset the start bit
-    write_controlword(client, 0x000F)
+    write_controlword(sock, 0x000F)
+
+def run_axis(sock, name):
+    """Enable one controller and run the test movement on it"""
+    report(sock, f"--- Testing {name} controller ---")
+    if not go_through_state_machine(sock):
+        return False
+    test_simple_movement(sock)
+    return True
+
+async def run_axes_concurrently(y_sock, z_sock):
+    """Test the Y and Z controllers at the same time instead of one after the other.
+    Returns True if both axes passed."""
+    # The socket helpers are blocking, so each axis runs in a worker thread;
+    # the two controllers share no state.
+    results = await asyncio.gather(
+        asyncio.to_thread(run_axis, y_sock, "Y-axis"),
+        asyncio.to_thread(run_axis, z_sock, "Z-axis")
+    )
+    return all(results)
 
 def main():
     # Connect to both controllers
-    y_client = create_modbus_client(Y_CONTROLLER_IP)
-    z_client = create_modbus_client(Z_CONTROLLER_IP)
+    y_sock = create_connection(Y_CONTROLLER_IP, "Y-axis")
+    z_sock = create_connection(Z_CONTROLLER_IP, "Z-axis")
     
-    if not (y_client and z_client):
+    if not (y_sock and z_sock):
         print("Failed to connect to one or both controllers. Exiting.")
         return
     
@@ -247,29 +447,26 @@ def main():
             print("\nMotor Controller Test Menu:")
             print("1) Test Y-axis controller")
             print("2) Test Z-axis controller")
-            print("3) Test both controllers sequentially")
+            print("3) Test both controllers concurrently")
             print("4) Exit")
             
             choice = input("Enter your choice (1-4): ")
             
             if choice == '1':
                 print("\n--- Testing Y-axis controller ---")
-                if go_through_state_machine(y_client):
-                    test_simple_movement(y_client)
+                if go_through_state_machine(y_sock):
+                    test_simple_movement(y_sock)
                     
             elif choice == '2':
                 print("\n--- Testing Z-axis controller ---")
-                if go_through_state_machine(z_client):
-                    test_simple_movement(z_client)
+                if go_through_state_machine(z_sock):
+                    test_simple_movement(z_sock)
                     
             elif choice == '3':
-                print("\n--- Testing Y-axis controller ---")
-                if go_through_state_machine(y_client):
-                    test_simple_movement(y_client)
-                
-                print("\n--- Testing Z-axis controller ---")
-                if go_through_state_machine(z_client):
-                    test_simple_movement(z_client)
+                if asyncio.run(run_axes_concurrently(y_sock, z_sock)):
+                    print("\nBoth axes completed the test movement")
+                else:
+                    print("\nTest movement failed on at least one axis")
                     
             elif choice == '4':
                 print("Exiting...")
@@ -280,10 +477,10 @@ def main():
     
     finally:
         # Close connections
-        if y_client:
-            y_client.close()
-        if z_client:
-            z_client.close()
+        if y_sock:
+            y_sock.close()
+        if z_sock:
+            z_sock.close()
         print("Connections closed")
 
 if __name__ == "__main__":
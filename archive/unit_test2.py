@@ -1,132 +1,369 @@
+import queue
+import selectors
 import socket
+import struct
+import threading
 import time
 import sys
 
+from packet_codec import (
+    MAX_ADU_SIZE, MBAP_WORD, enable_keepalive, frame_at, is_alive, parse_response, report
+)
+
 # Motor controller IP addresses
 Y_CONTROLLER_IP = "169.254.239.1"
 Z_CONTROLLER_IP = "169.254.239.2"
 MODBUS_PORT = 502
 
-def create_connection(ip_address, port=MODBUS_PORT):
+CONNECT_TIMEOUT = 5         # Seconds to wait for a controller to accept the connection
+RESPONSE_TIMEOUT = 0.25     # Seconds to wait for a response (round trips are sub-ms on the LAN)
+STATE_TIMEOUT = 2.0         # Seconds to wait for the drive to reach a new state
+STATE_POLL_PERIOD = 0.01    # Seconds between statusword polls while changing state
+START_TIMEOUT = 0.5         # Seconds to wait for a started movement to clear "target reached"
+MOVE_TIMEOUT = 50           # Seconds to wait for a movement to complete
+SYNC_MOVE_TIMEOUT = 100     # Seconds to wait for the synchronized movements to complete
+MOVE_POLL_PERIOD = 0.005    # Seconds between statusword polls while moving
+RESPONSE_SPIN = 0.0002      # Seconds to busy-poll for a response due right away (state changes)
+MOVE_SPIN = 0.001           # Seconds to busy-poll for a statusword response while moving
+KEEP_WARM_PERIOD = 30       # Seconds an open connection may idle before a statusword read
+KEEP_WARM_MISSES = 2        # Keep-warm reads in a row without a response before closing
+
+# Request templates (format according to section 6.6.5 of the manual), built once.
+# Each request is copied into the connection's transmit buffer, where only the
+# transaction ID and the variable fields are patched in.
+STATUSWORD_TEMPLATE = bytes([
+    0x00, 0x00,  # Transaction ID (patched per request)
+    0x00, 0x00,  # Protocol ID
+    0x00, 0x0D,  # Length
+    0x00,        # Unit ID
+    0x2B,        # Function code
+    0x0D,        # MEI type
+    0x00,        # Protocol option (0=read)
+    0x00,        # Reserved
+    0x00,        # Node ID
+    0x60, 0x41,  # Object Index (6041h)
+    0x00,        # Sub Index
+    0x00, 0x00,  # Starting Address
+    0x00,        # SDO Object
+    0x02         # Byte count
+])
+
+CONTROLWORD_TEMPLATE = bytes([
+    0x00, 0x00,  # Transaction ID (patched per request)
+    0x00, 0x00,  # Protocol ID
+    0x00, 0x0F,  # Length (15 bytes after byte 5)
+    0x00,        # Unit ID
+    0x2B,        # Function code
+    0x0D,        # MEI type
+    0x01,        # Protocol option (1=write)
+    0x00,        # Reserved
+    0x00,        # Node ID
+    0x60, 0x40,  # Object Index (6040h)
+    0x00,        # Sub Index
+    0x00, 0x00,  # Starting Address
+    0x00,        # SDO Object
+    0x02,        # Byte count
+    0x00, 0x00   # Value (little endian, patched per request)
+])
+
+# Object write requests, by byte count. The whole request is packed in one call:
+# Transaction ID, Protocol ID, Length, Unit ID, Function code, MEI type,
+# Protocol option, Reserved, Node ID, Object Index, Sub Index, Starting Address,
+# SDO Object, Byte count, then the value as bytes (it is little endian, the
+# header fields are big endian)
+WRITE_OBJECT_REQUEST = {size: struct.Struct(f'>HHHBBBBBBHBHBB{size}s') for size in (1, 2, 4)}
+
+class ModbusSocket(socket.socket):
+    """TCP socket that numbers its requests and tracks the ones sent without waiting"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tx_id = 0
+        self.tx_buf = bytearray(MAX_ADU_SIZE)  # Requests are assembled here from the templates
+        self.rx_buf = bytearray(MAX_ADU_SIZE)  # All responses are received into this buffer
+        self.rx_view = memoryview(self.rx_buf)
+        self.rx_start = 0  # Received bytes not consumed yet: rx_buf[rx_start:rx_end]
+        self.rx_end = 0
+        self.pending = {}  # Transaction ID -> message to print once the response arrives
+        self.last_activity = 0.0  # time.monotonic() of the last request sent (or attempted)
+        self.initialized = False  # Set once the drive was brought to 'Operation Enabled'
+        self.keep_warm_misses = 0  # Keep-warm reads in a row that timed out
+        self.name = ""  # Axis name that labels the messages about this controller
+
+def create_connection(ip_address, port=MODBUS_PORT, name=""):
     """Create a socket connection to the motor controller"""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(5)  # 5 second timeout
+    sock = ModbusSocket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.name = name
+    sock.settimeout(CONNECT_TIMEOUT)
+    # Send each small request immediately instead of waiting for delayed ACKs
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    enable_keepalive(sock)
     
     try:
-        print(f"Connecting to {ip_address}:{port}...")
+        report(sock, f"Connecting to {ip_address}:{port}...")
         sock.connect((ip_address, port))
-        print("Connected successfully!")
+        sock.settimeout(RESPONSE_TIMEOUT)
+        report(sock, "Connected successfully!")
         return sock
     except Exception as e:
-        print(f"Connection failed: {e}")
+        report(sock, f"Connection failed: {e}")
+        sock.close()
         return None
 
-def read_statusword(sock):
-    """Read the statusword (object 6041h) using the correct format from manual"""
+def prepare_request(sock, template):
+    """Copy a request template into the connection's transmit buffer; returns a view
+    of the request to patch the variable fields into"""
+    size = len(template)
+    sock.tx_buf[:size] = template
+    return memoryview(sock.tx_buf)[:size]
+
+def send_request(sock, packet):
+    """Send a packet with the next transaction ID of this connection; returns the ID"""
+    sock.tx_id = (sock.tx_id + 1) & 0xFFFF
+    struct.pack_into('>H', packet, 0, sock.tx_id)  # Transaction ID
+    sock.last_activity = time.monotonic()  # Also on failure, so nothing retries a dead link early
+    sock.sendall(packet)
+    return sock.tx_id
+
+def recv_into_spinning(sock, buffer, spin):
+    """recv_into() that busy-polls for up to spin seconds before blocking, so a
+    response due shortly is picked up without the thread sleeping and waking up"""
+    timeout = sock.gettimeout()
+    sock.settimeout(0)
     try:
-        # Format according to section 6.6.5 of the manual
-        packet = bytearray([
-            0x00, 0x0F,  # Transaction ID
-            0x00, 0x00,  # Protocol ID
-            0x00, 0x0D,  # Length
-            0x00,        # Unit ID
-            0x2B,        # Function code
-            0x0D,        # MEI type
-            0x00,        # Protocol option (0=read)
-            0x00,        # Reserved
-            0x00,        # Node ID
-            0x60, 0x41,  # Object Index (6041h)
-            0x00,        # Sub Index
-            0x00, 0x00,  # Starting Address
-            0x00,        # SDO Object
-            0x02         # Byte count
-        ])
+        deadline = time.perf_counter() + spin
+        while True:
+            try:
+                return sock.recv_into(buffer)
+            except BlockingIOError:
+                if time.perf_counter() >= deadline:
+                    break
+    finally:
+        sock.settimeout(timeout)
+    return sock.recv_into(buffer)
+
+class ModbusProtocolError(ConnectionError):
+    """The controller sent bytes that are not a Modbus TCP frame; the stream cannot
+    be resynchronized, so the connection is as good as lost"""
+
+def recv_next(sock, spin=0.0):
+    """Return the next response frame as (transaction ID, view into the connection's
+    receive buffer, valid until the next receive), receiving more data as needed.
+    Busy-polls for up to spin seconds before each blocking receive."""
+    view = sock.rx_view
+    while True:
+        frame = frame_at(view, sock.rx_start, sock.rx_end)
+        if frame is not None and frame[1] >= 8:
+            tx_id, size = frame
+            start = sock.rx_start
+            sock.rx_start += size
+            return tx_id, view[start:start + size]
         
-        sock.send(packet)
-        response = sock.recv(1024)
+        if sock.rx_end - sock.rx_start >= 6:
+            # The MBAP length counts the unit ID and the PDU: 2 to 254 bytes
+            length = MBAP_WORD.unpack_from(view, sock.rx_start + 4)[0]
+            if not 2 <= length <= MAX_ADU_SIZE - 6:
+                sock.rx_start = sock.rx_end = 0
+                sock.pending.clear()
+                raise ModbusProtocolError(f"Invalid MBAP length {length} in response header")
+        if sock.rx_start:
+            # Move the incomplete frame to the front of the buffer
+            remaining = sock.rx_end - sock.rx_start
+            view[:remaining] = view[sock.rx_start:sock.rx_end]
+            sock.rx_start, sock.rx_end = 0, remaining
+        if spin:
+            received = recv_into_spinning(sock, view[sock.rx_end:], spin)
+        else:
+            received = sock.recv_into(view[sock.rx_end:])
+        if not received:
+            raise ConnectionError("Connection closed by controller")
+        sock.rx_end += received
+
+def frame_buffered(sock):
+    """Check whether a complete frame is already in the connection's receive buffer"""
+    return frame_at(sock.rx_view, sock.rx_start, sock.rx_end) is not None
+
+def recv_response(sock, tx_id, spin=0.0):
+    """Receive frames until the response with transaction ID tx_id arrives; responses
+    nobody waits for (writes sent with ack=False) are skipped on the way.
+    Returns a view of the response (see recv_next)."""
+    while True:
+        response_id, response = recv_next(sock, spin)
+        if response_id == tx_id:
+            return response
+        sock.pending.pop(response_id, None)
+
+def flush_and_collect(sock):
+    """Collect the responses to all requests sent with pipeline=True, matching them
+    by transaction ID. Returns False if any of them failed."""
+    success = True
+    try:
+        while sock.pending:
+            response_id, response = recv_next(sock)
+            message = sock.pending.pop(response_id, None)
+            if message is None:
+                continue  # Response to a request nobody is waiting for anymore
+            if len(response) < 8 or response[7] & 0x80:
+                report(sock, f"Error response instead of: {message}")
+                success = False
+            else:
+                report(sock, message)
+    except Exception as e:
+        report(sock, f"Error collecting responses: {e}")
+        sock.pending.clear()
+        return False
+    return success
+
+def request_statusword(sock):
+    """Send a statusword (object 6041h) read request; returns its transaction ID"""
+    return send_request(sock, prepare_request(sock, STATUSWORD_TEMPLATE))
+
+def read_statusword(sock, quiet=False, spin=0.0):
+    """Read the statusword (object 6041h) using the correct format from manual"""
+    try:
+        response = recv_response(sock, request_statusword(sock), spin)
         
         # According to section 6.6.6, the statusword should be in bytes 19-20 (little endian)
-        if len(response) >= 21:
-            statusword = response[19] | (response[20] << 8)
-            print(f"Statusword: 0x{statusword:04X}")
+        statusword = parse_response(response, 2)
+        if statusword is not None:
+            if not quiet:
+                report(sock, f"Statusword: 0x{statusword:04X}")
             return statusword
         else:
-            print("Response too short")
+            report(sock, "Response too short")
             return None
             
     except Exception as e:
-        print(f"Error reading statusword: {e}")
+        report(sock, f"Error reading statusword: {e}")
         return None
 
-def write_controlword(sock, value):
-    """Write to the controlword (object 6040h)"""
+def write_controlword(sock, value, pipeline=False, ack=True):
+    """Write to the controlword (object 6040h). With pipeline=True the response is
+    not awaited; collect it with flush_and_collect(). With ack=False it is not
+    collected at all: the next statusword read shows whether the write took effect."""
     try:
-        # Format according to section 6.6.5 of the manual
-        packet = bytearray([
-            0x00, 0x0F,  # Transaction ID
-            0x00, 0x00,  # Protocol ID
-            0x00, 0x0F,  # Length (15 bytes after byte 5)
-            0x00,        # Unit ID
-            0x2B,        # Function code
-            0x0D,        # MEI type
-            0x01,        # Protocol option (1=write)
-            0x00,        # Reserved
-            0x00,        # Node ID
-            0x60, 0x40,  # Object Index (6040h)
-            0x00,        # Sub Index
-            0x00, 0x00,  # Starting Address
-            0x00,        # SDO Object
-            0x02,        # Byte count
-            value & 0xFF, (value >> 8) & 0xFF  # Value (little endian)
-        ])
+        packet = prepare_request(sock, CONTROLWORD_TEMPLATE)
+        struct.pack_into('<H', packet, 19, value & 0xFFFF)  # Value (little endian)
+        
+        tx_id = send_request(sock, packet)
+        if pipeline:
+            sock.pending[tx_id] = f"Controlword 0x{value:04X} written"
+            return True
+        if not ack:
+            return True
         
-        sock.send(packet)
-        response = sock.recv(1024)
+        recv_response(sock, tx_id, RESPONSE_SPIN)
         
         return True
             
     except Exception as e:
-        print(f"Error writing controlword: {e}")
+        report(sock, f"Error writing controlword: {e}")
         return False
 
-def write_object(sock, index, sub_index, value, size):
-    """Write to a CANopen object"""
+def write_object(sock, index, sub_index, value, size, pipeline=False, ack=True):
+    """Write to a CANopen object. With pipeline=True the response is not awaited;
+    collect it with flush_and_collect(). With ack=False it is not collected at all."""
     try:
-        # Basic header
-        packet = bytearray([
-            0x00, 0x0F,  # Transaction ID
-            0x00, 0x00,  # Protocol ID
-            0x00, 0x0D + size,  # Length (13 + data size)
-            0x00,        # Unit ID
-            0x2B,        # Function code
-            0x0D,        # MEI type
-            0x01,        # Protocol option (1=write)
-            0x00,        # Reserved
-            0x00,        # Node ID
-            (index >> 8) & 0xFF, index & 0xFF,  # Object Index 
-            sub_index,   # Sub Index
-            0x00, 0x00,  # Starting Address
-            0x00,        # SDO Object
-            size,        # Byte count
-        ])
+        request = WRITE_OBJECT_REQUEST[size]
+        request.pack_into(sock.tx_buf, 0,
+                          0x0000, 0x0000, 0x0D + size,  # Transaction ID (set on send), Protocol ID, Length
+                          0x00, 0x2B, 0x0D,             # Unit ID, Function code, MEI type
+                          0x01, 0x00, 0x00,             # Protocol option (1=write), Reserved, Node ID
+                          index, sub_index,             # Object Index, Sub Index
+                          0x0000, 0x00, size,           # Starting Address, SDO Object, Byte count
+                          (value & ((1 << (8 * size)) - 1)).to_bytes(size, 'little'))
+        packet = memoryview(sock.tx_buf)[:request.size]
         
-        # Add value in little endian format
-        value_bytes = bytearray()
-        for i in range(size):
-            value_bytes.append((value >> (8*i)) & 0xFF)
+        tx_id = send_request(sock, packet)
+        if pipeline:
+            sock.pending[tx_id] = f"Object 0x{index:04X}:{sub_index} written with value {value}"
+            return True
+        if not ack:
+            return True
         
-        packet.extend(value_bytes)
+        recv_response(sock, tx_id)
         
-        sock.send(packet)
-        response = sock.recv(1024)
-        
-        print(f"Object 0x{index:04X}:{sub_index} written with value {value}")
+        report(sock, f"Object 0x{index:04X}:{sub_index} written with value {value}")
         return True
             
     except Exception as e:
-        print(f"Error writing object: {e}")
+        report(sock, f"Error writing object: {e}")
         return False
 
+def wait_for_status(sock, mask, value, timeout=STATE_TIMEOUT, period=STATE_POLL_PERIOD,
+                    spin=RESPONSE_SPIN):
+    """Poll the statusword until (statusword & mask) == value or the timeout expires.
+    Returns the last statusword read (printed once at the end)."""
+    deadline = time.monotonic() + timeout
+    status = read_statusword(sock, quiet=True, spin=spin)
+    while (status is None or (status & mask) != value) and time.monotonic() < deadline:
+        time.sleep(period)
+        status = read_statusword(sock, quiet=True, spin=spin)
+    
+    if status is not None:
+        report(sock, f"Statusword: 0x{status:04X}")
+    return status
+
+def wait_for_movement_start(sock):
+    """Wait for the drive to accept a new target, so a "target reached" left over
+    from the previous movement is not taken for the end of this one"""
+    # Target reached (bit 10) drops once the drive accepts the new target; a very
+    # short movement may already be done by then, so this wait may time out
+    wait_for_status(sock, 0x0400, 0x0000, START_TIMEOUT, MOVE_POLL_PERIOD, MOVE_SPIN)
+
+def wait_for_target_reached(sock, timeout=MOVE_TIMEOUT):
+    """Wait for a started movement to reach its target. Returns True once it has."""
+    status = wait_for_status(sock, 0x0400, 0x0400, timeout, MOVE_POLL_PERIOD, MOVE_SPIN)
+    return status is not None and (status & 0x0400) != 0
+
+def read_statuswords(socks, timeout=5):
+    """Read the statusword of several controllers at once: the requests all go out
+    first, then the replies are collected in whatever order they arrive.
+    Returns the statuswords in the order of socks (None where no valid reply came)."""
+    statuswords = [None] * len(socks)
+    tx_ids = [None] * len(socks)
+    selector = selectors.DefaultSelector()
+    try:
+        for i, sock in enumerate(socks):
+            tx_ids[i] = request_statusword(sock)
+            selector.register(sock, selectors.EVENT_READ, i)
+        
+        deadline = time.monotonic() + timeout
+        while selector.get_map() and time.monotonic() < deadline:
+            for key, _ in selector.select(deadline - time.monotonic()):
+                sock = key.fileobj
+                while True:
+                    response_id, response = recv_next(sock)
+                    if response_id == tx_ids[key.data]:
+                        selector.unregister(sock)
+                        # According to section 6.6.6, the statusword is in bytes 19-20 (little endian)
+                        statuswords[key.data] = parse_response(response, 2)
+                        break
+                    # Acknowledgement of a write sent with ack=False; the statusword
+                    # may already be buffered behind it, otherwise wait for it
+                    sock.pending.pop(response_id, None)
+                    if not frame_buffered(sock):
+                        break
+    except Exception as e:
+        print(f"Error reading statuswords: {e}")
+    finally:
+        selector.close()
+    return statuswords
+
+def wait_for_statuses(socks, mask, value, timeout=STATE_TIMEOUT, period=STATE_POLL_PERIOD):
+    """Poll the statuswords of several controllers together until (statusword & mask)
+    == value on all of them or the timeout expires. Returns the last statuswords read."""
+    deadline = time.monotonic() + timeout
+    statuses = read_statuswords(socks)
+    while (any(status is None or (status & mask) != value for status in statuses)
+           and time.monotonic() < deadline):
+        time.sleep(period)
+        statuses = read_statuswords(socks)
+    
+    for sock, status in zip(socks, statuses):
+        if status is not None:
+            report(sock, f"Statusword: 0x{status:04X}")
+    return statuses
+
 def go_through_state_machine(sock):
     """Go through the state machine to reach 'Operation Enabled' state"""
     # First check current status
@@ -135,162 +372,248 @@ def go_through_state_machine(sock):
         return False
     
     # Command: Shutdown (prepare for switch on)
-    print("\nSending 'Shutdown' command...")
-    write_controlword(sock, 0x0006)
-    time.sleep(5)
-    status = read_statusword(sock)
+    report(sock, "\nSending 'Shutdown' command...")
+    write_controlword(sock, 0x0006, ack=False)
+    status = wait_for_status(sock, 0x006F, 0x0021)  # Ready to Switch On
     
     # Command: Switch On
-    print("\nSending 'Switch On' command...")
-    write_controlword(sock, 0x0007)
-    time.sleep(5)
-    status = read_statusword(sock)
+    report(sock, "\nSending 'Switch On' command...")
+    write_controlword(sock, 0x0007, ack=False)
+    status = wait_for_status(sock, 0x006F, 0x0023)  # Switched On
     
     # Command: Enable Operation
-    print("\nSending 'Enable Operation' command...")
-    write_controlword(sock, 0x000F)
-    time.sleep(5)
-    status = read_statusword(sock)
+    report(sock, "\nSending 'Enable Operation' command...")
+    write_controlword(sock, 0x000F, ack=False)
+    status = wait_for_status(sock, 0x006F, 0x0027)  # Operation Enabled
     
     # Check if we reached Operation Enabled state
     if status is not None and (status & 0x0627) == 0x0627:
-        print("Successfully reached 'Operation Enabled' state")
+        report(sock, "Successfully reached 'Operation Enabled' state")
         return True
     else:
-        print("Failed to reach 'Operation Enabled' state")
+        report(sock, "Failed to reach 'Operation Enabled' state")
         return False
 
 def test_simple_movement(sock):
     """Test a simple movement in Profile Position mode"""
-    # Set operation mode to Profile Position (1)
-    print("\nSetting operation mode to Profile Position...")
-    write_object(sock, 0x6060, 0, 1, 1)
-    time.sleep(5)
-    
-    # Set target position (1000 increments)
-    print("\nSetting target position to 1000...")
-    write_object(sock, 0x607A, 0, 100000, 4)
-    time.sleep(5)
-    
-    # Set profile velocity (1000 units/sec)
-    print("\nSetting profile velocity to 1000...")
-    write_object(sock, 0x6081, 0, 1000, 4)
-    time.sleep(5)
-    
-    # Set profile acceleration (2000 units/sec²)
-    print("\nSetting profile acceleration to 2000...")
-    write_object(sock, 0x6083, 0, 2000, 4)
-    time.sleep(5)
+    # Set operation mode to Profile Position (1), target position (1000 increments),
+    # profile velocity (1000 units/sec) and profile acceleration (2000 units/sec²)
+    # back to back, then collect the four responses
+    report(sock, "\nSetting operation mode, target position, profile velocity and acceleration...")
+    write_object(sock, 0x6060, 0, 1, 1, pipeline=True)
+    write_object(sock, 0x607A, 0, 100000, 4, pipeline=True)
+    write_object(sock, 0x6081, 0, 1000, 4, pipeline=True)
+    write_object(sock, 0x6083, 0, 2000, 4, pipeline=True)
+    flush_and_collect(sock)
     
     # Start the movement (bit 4 set to 1)
-    print("\nStarting movement...")
-    write_controlword(sock, 0x001F)
-    time.sleep(5)
+    report(sock, "\nStarting movement...")
+    write_controlword(sock, 0x001F, ack=False)
     
     # Wait for movement to complete
-    print("\nWaiting for movement to complete...")
-    for _ in range(10):
-        status = read_statusword(sock)
-        if status is not None and (status & 0x0400):  # Check target reached bit
-            print("Movement completed")
-            break
-        time.sleep(5)
+    report(sock, "\nWaiting for movement to complete...")
+    wait_for_movement_start(sock)
+    if wait_for_target_reached(sock):  # Check target reached bit
+        report(sock, "Movement completed")
     
     # Reset the start bit
-    write_controlword(sock, 0x000F)
+    write_controlword(sock, 0x000F, ack=False)
     
     # Return to start position
-    print("\nSetting target position to 0...")
+    report(sock, "\nSetting target position to 0...")
     write_object(sock, 0x607A, 0, 0, 4)
-    time.sleep(5)
     
     # Start the movement
-    print("\nReturning to start position...")
-    write_controlword(sock, 0x001F)
-    time.sleep(5)
+    report(sock, "\nReturning to start position...")
+    write_controlword(sock, 0x001F, ack=False)
     
     # Wait for movement to complete
-    for _ in range(10):
-        status = read_statusword(sock)
-        if status is not None and (status & 0x0400):
-            print("Return movement completed")
-            break
-        time.sleep(5)
+    wait_for_movement_start(sock)
+    if wait_for_target_reached(sock):
+        report(sock, "Return movement completed")
     
     # Reset the start bit
-    write_controlword(sock, 0x000F)
+    write_controlword(sock, 0x000F, ack=False)
 
-def test_both_axes_in_sync(y_sock, z_sock):
-    """Test synchronized movement of both Y and Z axes"""
-    # Set both controllers to Profile Position mode
-    print("\nSetting both controllers to Profile Position mode...")
-    write_object(y_sock, 0x6060, 0, 1, 1)
-    write_object(z_sock, 0x6060, 0, 1, 1)
-    time.sleep(5)
+def wait_for_both_targets_reached(y_sock, z_sock, timeout=SYNC_MOVE_TIMEOUT):
+    """Wait for movements started on both axes to reach their targets"""
+    socks = [y_sock, z_sock]
+    # As in wait_for_movement_start: let both drives accept their new targets first
+    wait_for_statuses(socks, 0x0400, 0x0000, START_TIMEOUT, MOVE_POLL_PERIOD)
+    statuses = wait_for_statuses(socks, 0x0400, 0x0400, timeout, MOVE_POLL_PERIOD)
+    return all(status is not None and (status & 0x0400) for status in statuses)
+
+class AxisWorker(threading.Thread):
+    """Thread that owns the connection to one controller and runs the commands queued
+    for it, so the axes exchange their requests with the controllers in parallel"""
+    _BARRIER = object()
+    _STOP = object()
     
-    # Set target positions
-    print("\nSetting target positions...")
-    write_object(y_sock, 0x607A, 0, 1000, 4)
-    write_object(z_sock, 0x607A, 0, 1000, 4)
-    time.sleep(5)
+    def __init__(self, name, sock, barrier):
+        super().__init__(name=name, daemon=True)
+        self.sock = sock
+        self.barrier = barrier  # Shared by all workers and the thread waiting for them
+        self.commands = queue.Queue()
     
-    # Set velocities
-    print("\nSetting velocities...")
-    write_object(y_sock, 0x6081, 0, 1000, 4)
-    write_object(z_sock, 0x6081, 0, 1000, 4)
-    time.sleep(5)
+    def enqueue(self, func, *args, **kwargs):
+        """Queue func(sock, *args, **kwargs) to run on this axis"""
+        self.commands.put((func, args, kwargs))
     
-    # Set accelerations
-    print("\nSetting accelerations...")
-    write_object(y_sock, 0x6083, 0, 2000, 4)
-    write_object(z_sock, 0x6083, 0, 2000, 4)
-    time.sleep(5)
+    def wait_barrier(self):
+        """Queue a stop at the barrier, where the worker waits for all other parties"""
+        self.commands.put(self._BARRIER)
     
-    # Start movements simultaneously
-    print("\nStarting synchronized movement...")
-    write_controlword(y_sock, 0x001F)
-    write_controlword(z_sock, 0x001F)
+    def stop(self):
+        """Let the worker finish the queued commands, then end the thread"""
+        self.commands.put(self._STOP)
+        self.join()
+    
+    def run(self):
+        while True:
+            command = self.commands.get()
+            if command is self._STOP:
+                return
+            if command is self._BARRIER:
+                self.barrier.wait()
+                continue
+            func, args, kwargs = command
+            try:
+                func(self.sock, *args, **kwargs)
+            except Exception as e:
+                # Keep going, so the other parties are not left waiting at the barrier
+                report(self.sock, f"Command failed: {e}")
+
+def run_on_axes(workers, *commands):
+    """Queue the commands (func, *args) on every worker and wait until all workers have run them"""
+    for worker in workers:
+        for func, *args in commands:
+            worker.enqueue(func, *args)
+        worker.wait_barrier()
+    workers[0].barrier.wait()
+
+def test_both_axes_in_sync(y_sock, z_sock):
+    """Test synchronized movement of both Y and Z axes"""
+    barrier = threading.Barrier(3)  # Y worker, Z worker and this thread
+    workers = [AxisWorker("Y-axis", y_sock, barrier), AxisWorker("Z-axis", z_sock, barrier)]
+    for worker in workers:
+        worker.start()
     
-    # Wait for movements to complete
-    print("\nWaiting for movements to complete...")
-    for _ in range(20):
-        y_status = read_statusword(y_sock)
-        z_status = read_statusword(z_sock)
+    try:
+        # Each worker sets Profile Position mode, target position, velocity and
+        # acceleration back to back on its controller, then collects the responses
+        print("\nSetting both controllers to Profile Position mode with movement parameters...")
+        run_on_axes(workers,
+                    (write_object, 0x6060, 0, 1, 1, True),  # pipeline=True
+                    (write_object, 0x607A, 0, 1000, 4, True),
+                    (write_object, 0x6081, 0, 1000, 4, True),
+                    (write_object, 0x6083, 0, 2000, 4, True),
+                    (flush_and_collect,))
+        
+        # Start movements simultaneously; the statusword polls below confirm them
+        print("\nStarting synchronized movement...")
+        write_controlword(y_sock, 0x001F, ack=False)
+        write_controlword(z_sock, 0x001F, ack=False)
         
-        if (y_status is not None and (y_status & 0x0400)) and (z_status is not None and (z_status & 0x0400)):
+        # Wait for movements to complete, polling both controllers with each round
+        print("\nWaiting for movements to complete...")
+        if wait_for_both_targets_reached(y_sock, z_sock):
             print("Both movements completed")
-            break
-        time.sleep(5)
-    
-    # Reset start bits
-    write_controlword(y_sock, 0x000F)
-    write_controlword(z_sock, 0x000F)
-    
-    # Return to start positions
-    print("\nReturning to start positions...")
-    write_object(y_sock, 0x607A, 0, 0, 4)
-    write_object(z_sock, 0x607A, 0, 0, 4)
-    time.sleep(5)
-    
-    # Start return movements
-    write_controlword(y_sock, 0x001F)
-    write_controlword(z_sock, 0x001F)
-    
-    # Wait for return movements to complete
-    for _ in range(20):
-        y_status = read_statusword(y_sock)
-        z_status = read_statusword(z_sock)
         
-        if (y_status is not None and (y_status & 0x0400)) and (z_status is not None and (z_status & 0x0400)):
+        # Reset start bits and return to start positions
+        print("\nReturning to start positions...")
+        run_on_axes(workers,
+                    (write_controlword, 0x000F, False, False),  # pipeline=False, ack=False
+                    (write_object, 0x607A, 0, 0, 4))
+        
+        # Start return movements
+        write_controlword(y_sock, 0x001F, ack=False)
+        write_controlword(z_sock, 0x001F, ack=False)
+        
+        # Wait for return movements to complete
+        if wait_for_both_targets_reached(y_sock, z_sock):
             print("Both return movements completed")
-            break
-        time.sleep(5)
+        
+        # Reset start bits
+        write_controlword(y_sock, 0x000F, ack=False)
+        write_controlword(z_sock, 0x000F, ack=False)
+    finally:
+        for worker in workers:
+            worker.stop()
+
+# Open connections per controller IP, reused across menu choices. The menu
+# actions hold the lock, so keep-warm reads never interleave with them.
+_connections = {}
+_connections_lock = threading.Lock()
+
+def _is_alive(sock):
+    """Discard stale bytes on an open connection and check that it is still open"""
+    sock.rx_start = sock.rx_end = 0
+    sock.pending.clear()  # Their responses are among the bytes discarded
+    return is_alive(sock)
+
+def get_connection(ip_address, name):
+    """Return the open connection to a controller in 'Operation Enabled' state, reconnecting
+    and going through the state machine again only when needed (None on failure)"""
+    sock = _connections.get(ip_address)
+    if sock is not None and not _is_alive(sock):
+        print(f"Connection to {ip_address} was dropped, reconnecting...")
+        sock.close()
+        del _connections[ip_address]
+        sock = None
+    
+    if sock is None:
+        sock = create_connection(ip_address, name=name)
+        if sock is None:
+            return None
+        _connections[ip_address] = sock
+    else:
+        sock.keep_warm_misses = 0  # Only misses in a row while idle count
+        if sock.initialized:
+            # A fault or a failed request since the last test means initializing again
+            status = read_statusword(sock, quiet=True)
+            sock.initialized = status is not None and (status & 0x006F) == 0x0027
     
-    # Reset start bits
-    write_controlword(y_sock, 0x000F)
-    write_controlword(z_sock, 0x000F)
+    if not sock.initialized:
+        sock.initialized = go_through_state_machine(sock)
+    return sock if sock.initialized else None
+
+def close_connections():
+    """Close every open connection"""
+    with _connections_lock:
+        for sock in _connections.values():
+            sock.close()
+        _connections.clear()
+
+def keep_connections_warm():
+    """Background thread: read the statusword on connections idle for KEEP_WARM_PERIOD,
+    so the controllers do not drop them while the menu waits for input. A single
+    timeout is tolerated (the late response is skipped by the next read); a connection
+    that misses KEEP_WARM_MISSES reads in a row or fails otherwise is closed and
+    forgotten, and get_connection() opens a new one when it is needed again."""
+    while True:
+        time.sleep(1)
+        with _connections_lock:
+            now = time.monotonic()
+            for ip_address, sock in list(_connections.items()):
+                if now - sock.last_activity < KEEP_WARM_PERIOD:
+                    continue
+                try:
+                    recv_response(sock, request_statusword(sock))
+                    sock.keep_warm_misses = 0
+                    continue
+                except socket.timeout:
+                    sock.keep_warm_misses += 1
+                    if sock.keep_warm_misses < KEEP_WARM_MISSES:
+                        continue
+                    report(sock, f"\nNo response to {KEEP_WARM_MISSES} keep-warm reads, closing the connection")
+                except Exception as e:
+                    report(sock, f"\nKeep-warm read failed, closing the connection: {e}")
+                sock.close()
+                del _connections[ip_address]
 
 def main():
+    threading.Thread(target=keep_connections_warm, name="keep-warm", daemon=True).start()
+    
     while True:
         print("\n========== Motor Controller Test Menu ==========")
         print("1) Test Y-axis controller")
@@ -301,72 +624,50 @@ def main():
         
         choice = input("Enter your choice (1-5): ")
         
-        if choice == '1':
-            y_sock = create_connection(Y_CONTROLLER_IP)
-            if y_sock:
-                try:
-                    print("\n--- Testing Y-axis controller ---")
-                    if go_through_state_machine(y_sock):
-                        test_simple_movement(y_sock)
-                finally:
-                    y_sock.close()
-                    
-        elif choice == '2':
-            z_sock = create_connection(Z_CONTROLLER_IP)
-            if z_sock:
-                try:
-                    print("\n--- Testing Z-axis controller ---")
-                    if go_through_state_machine(z_sock):
-                        test_simple_movement(z_sock)
-                finally:
-                    z_sock.close()
-                    
-        elif choice == '3':
-            y_sock = create_connection(Y_CONTROLLER_IP)
-            z_sock = create_connection(Z_CONTROLLER_IP)
-            
-            if y_sock and z_sock:
-                try:
-                    print("\n--- Testing Y-axis controller ---")
-                    if go_through_state_machine(y_sock):
-                        test_simple_movement(y_sock)
-                    
-                    print("\n--- Testing Z-axis controller ---")
-                    if go_through_state_machine(z_sock):
-                        test_simple_movement(z_sock)
-                finally:
-                    if y_sock:
-                        y_sock.close()
-                    if z_sock:
-                        z_sock.close()
-                    
-        elif choice == '4':
-            y_sock = create_connection(Y_CONTROLLER_IP)
-            z_sock = create_connection(Z_CONTROLLER_IP)
-            
-            if y_sock and z_sock:
-                try:
-                    print("\n--- Initializing Y-axis controller ---")
-                    y_initialized = go_through_state_machine(y_sock)
-                    
-                    print("\n--- Initializing Z-axis controller ---")
-                    z_initialized = go_through_state_machine(z_sock)
-                    
-                    if y_initialized and z_initialized:
-                        print("\n--- Running synchronized movement test ---")
-                        test_both_axes_in_sync(y_sock, z_sock)
-                finally:
-                    if y_sock:
-                        y_sock.close()
-                    if z_sock:
-                        z_sock.close()
-                    
-        elif choice == '5':
-            print("Exiting...")
-            sys.exit(0)
-            
-        else:
-            print("Invalid choice. Please enter a number between 1 and 5.")
+        with _connections_lock:
+            if choice == '1':
+                print("\n--- Testing Y-axis controller ---")
+                y_sock = get_connection(Y_CONTROLLER_IP, "Y-axis")
+                if y_sock:
+                    test_simple_movement(y_sock)
+                        
+            elif choice == '2':
+                print("\n--- Testing Z-axis controller ---")
+                z_sock = get_connection(Z_CONTROLLER_IP, "Z-axis")
+                if z_sock:
+                    test_simple_movement(z_sock)
+                        
+            elif choice == '3':
+                print("\n--- Testing Y-axis controller ---")
+                y_sock = get_connection(Y_CONTROLLER_IP, "Y-axis")
+                if y_sock:
+                    test_simple_movement(y_sock)
+                
+                print("\n--- Testing Z-axis controller ---")
+                z_sock = get_connection(Z_CONTROLLER_IP, "Z-axis")
+                if z_sock:
+                    test_simple_movement(z_sock)
+                        
+            elif choice == '4':
+                print("\n--- Initializing Y-axis controller ---")
+                y_sock = get_connection(Y_CONTROLLER_IP, "Y-axis")
+                
+                print("\n--- Initializing Z-axis controller ---")
+                z_sock = get_connection(Z_CONTROLLER_IP, "Z-axis")
+                
+                if y_sock and z_sock:
+                    print("\n--- Running synchronized movement test ---")
+                    test_both_axes_in_sync(y_sock, z_sock)
+                        
+            elif choice == '5':
+                break
+                
+            else:
+                print("Invalid choice. Please enter a number between 1 and 5.")
+    
+    print("Exiting...")
+    close_connections()
+    sys.exit(0)
 
 if __name__ == "__main__":
     main()
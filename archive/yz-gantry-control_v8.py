@@ -12,12 +12,19 @@ Date: April 30, 2025
 """
 
 import tkinter as tk
+import queue
+import socket
+import threading
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pymodbus.client import ModbusTcpClient
 from pymodbus.constants import Endian
+from pymodbus.exceptions import ConnectionException, ModbusIOException
 from pymodbus.payload import BinaryPayloadBuilder, BinaryPayloadDecoder
 
+from packet_codec import enable_keepalive
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -30,6 +37,11 @@ Y_CONTROLLER_IP = "169.254.239.1"
 Z_CONTROLLER_IP = "169.254.239.2"
 MODBUS_PORT = 502
 
+# Connection handling
+RESPONSE_TIMEOUT = 0.25      # Seconds to wait for a response (round trips are sub-ms on the LAN)
+RECONNECT_DELAY_MIN = 0.05   # Seconds before the next reconnect attempt after a failed one,
+RECONNECT_DELAY_MAX = 0.5    # doubling with every further failure up to this limit
+
 # Register addresses for motor control
 # These may need adjustment based on your specific dryve D1 configuration
 REG_CONTROL = 0      # Control register
@@ -41,6 +53,14 @@ REG_ACCEL = 8        # Acceleration register
 REG_DECEL = 10       # Deceleration register
 REG_OP_MODE = 12     # Operation mode register
 
+# All registers above (control through operation mode) are read in one request
+SNAPSHOT_REGISTERS = REG_OP_MODE + 1
+SNAPSHOT_MAX_AGE = 0.05  # Seconds a snapshot is reused by back-to-back status/position checks
+
+# GUI timing
+POSITION_POLL_PERIOD = 0.2  # Seconds between position reads on the I/O thread
+DISPLAY_UPDATE_MS = 50      # Milliseconds between checks for new positions on the Tk thread
+
 # Control register bits
 CTRL_START = 0x0001      # Start bit
 CTRL_STOP = 0x0002       # Stop bit
@@ -67,6 +87,33 @@ JOG_VELOCITY = 50    # Velocity in mm/s
 JOG_ACCELERATION = 200    # Acceleration in mm/s²
 JOG_DECELERATION = 200    # Deceleration in mm/s²
 
+def to_registers32(value):
+    """Split a 32-bit value into two registers, low word first"""
+    value &= 0xFFFFFFFF
+    return [value & 0xFFFF, value >> 16]
+
+def from_registers32(low, high):
+    """Join two registers, low word first, into a signed 32-bit value"""
+    value = (high << 16) | low
+    return value - 0x100000000 if value & 0x80000000 else value
+
+class NoDelayModbusTcpClient(ModbusTcpClient):
+    """
+    ModbusTcpClient that disables Nagle's algorithm and enables TCP keepalive on
+    every socket it opens, including the ones pymodbus opens when it reconnects
+    on its own.
+    """
+    _nodelay_socket = None
+    
+    def connect(self):
+        connected = super().connect()
+        if connected and self.socket is not self._nodelay_socket:
+            # Send each small request immediately instead of waiting for delayed ACKs
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            enable_keepalive(self.socket)
+            self._nodelay_socket = self.socket
+        return connected
+
 class ModbusMotorController:
     """
     Client for standard Modbus TCP communication with dryve D1 controller.
@@ -74,8 +121,14 @@ class ModbusMotorController:
     def __init__(self, ip_address, port=502):
         self.ip_address = ip_address
         self.port = port
-        self.client = ModbusTcpClient(host=ip_address, port=port)
+        self.client = NoDelayModbusTcpClient(host=ip_address, port=port, timeout=RESPONSE_TIMEOUT)
         self.connected = False
+        self._reconnect_delay = RECONNECT_DELAY_MIN
+        self._reconnect_time = 0.0  # No reconnect attempt before this time.monotonic()
+        self._snapshot = None
+        self._snapshot_time = 0.0
+        self._cached_pos = None  # Position of the motor while it stands still
+        self._combined_param_write = True  # Cleared if the gateway rejects it
         
     def connect(self):
         """Connect to the controller"""
@@ -98,13 +151,44 @@ class ModbusMotorController:
             self.connected = False
             logger.info(f"Disconnected from motor controller at {self.ip_address}")
     
+    def _reconnect(self):
+        """Reopen the connection after a failed request. Attempts are spaced with an
+        exponential backoff; inside the backoff this fails at once without trying."""
+        now = time.monotonic()
+        if now < self._reconnect_time:
+            return False
+        
+        self.client.close()
+        if self.client.connect():
+            logger.info(f"Reconnected to motor controller at {self.ip_address}")
+            self._reconnect_delay = RECONNECT_DELAY_MIN
+            return True
+        
+        self._reconnect_time = now + self._reconnect_delay
+        self._reconnect_delay = min(self._reconnect_delay * 2, RECONNECT_DELAY_MAX)
+        return False
+    
+    def _execute(self, request, *args):
+        """Run a client request. If it timed out or the connection broke, reconnect
+        and run it once more."""
+        try:
+            result = request(*args)
+            if not isinstance(result, ModbusIOException):  # pymodbus returns timeouts
+                return result
+        except (ConnectionException, ModbusIOException, OSError):
+            pass
+        
+        if not self._reconnect():
+            raise ConnectionException(f"Not connected to {self.ip_address}")
+        return request(*args)
+    
     def read_register(self, address, count=1):
         """Read holding registers from the controller"""
         if not self.connected:
             return None
         
         try:
-            result = self.client.read_holding_registers(address, count)
+            result = self._execute(self.client.read_holding_registers, address, count)
             if result.isError():
                 logger.error(f"Error reading registers at address {address}: {result}")
                 return None
@@ -118,8 +202,9 @@ class ModbusMotorController:
         if not self.connected:
             return False
         
+        self._snapshot = None  # The write may change status and position
         try:
-            result = self.client.write_register(address, value)
+            result = self._execute(self.client.write_register, address, value)
             if result.isError():
                 logger.error(f"Error writing to register at address {address}: {result}")
                 return False
@@ -133,8 +218,9 @@ class ModbusMotorController:
         if not self.connected:
             return False
         
+        self._snapshot = None  # The write may change status and position
         try:
-            result = self.client.write_registers(address, values)
+            result = self._execute(self.client.write_registers, address, values)
             if result.isError():
                 logger.error(f"Error writing to registers at address {address}: {result}")
                 return False
@@ -143,6 +229,32 @@ class ModbusMotorController:
             logger.error(f"Error writing to registers at address {address}: {e}")
             return False
     
+    def write_movement_parameters(self, mode=None):
+        """Write speed, acceleration and deceleration, and the operation mode if given.
+        
+        They are written with one FC16 request starting at REG_SPEED, each parameter as
+        32 bits (low word first). That request also writes the high words in registers
+        7, 9 and 11, which single FC6 writes of each parameter leave alone; a gateway
+        that does not map them rejects the request with an exception response, so
+        nothing is written. Such a gateway gets the per-parameter FC6 writes instead,
+        from then on.
+        """
+        if self._combined_param_write:
+            values = (to_registers32(JOG_VELOCITY) + to_registers32(JOG_ACCELERATION) +
+                      to_registers32(JOG_DECELERATION))
+            if mode is not None:
+                values.append(mode)  # REG_OP_MODE follows REG_DECEL
+            if self.write_registers(REG_SPEED, values):
+                return True
+            logger.warning("Combined parameter write failed, using one write per parameter")
+            self._combined_param_write = False
+        
+        writes = [(REG_SPEED, JOG_VELOCITY), (REG_ACCEL, JOG_ACCELERATION),
+                  (REG_DECEL, JOG_DECELERATION)]
+        if mode is not None:
+            writes.append((REG_OP_MODE, mode))
+        return all(self.write_register(address, value) for address, value in writes)
+    
     def initialize_motor(self):
         """Initialize the motor controller"""
         # Enable the motor
@@ -150,22 +262,9 @@ class ModbusMotorController:
             logger.error("Failed to enable motor")
             return False
         
-        # Set operation mode to position mode
-        if not self.write_register(REG_OP_MODE, MODE_POSITION):
-            logger.error("Failed to set operation mode")
-            return False
-            
-        # Set default movement parameters
-        if not self.write_register(REG_SPEED, JOG_VELOCITY):
-            logger.error("Failed to set default speed")
-            return False
-            
-        if not self.write_register(REG_ACCEL, JOG_ACCELERATION):
-            logger.error("Failed to set default acceleration")
-            return False
-            
-        if not self.write_register(REG_DECEL, JOG_DECELERATION):
-            logger.error("Failed to set default deceleration")
+        # Set default movement parameters and operation mode to position mode
+        if not self.write_movement_parameters(MODE_POSITION):
+            logger.error("Failed to set default movement parameters and operation mode")
             return False
         
         # Check if motor is ready
@@ -182,50 +281,70 @@ class ModbusMotorController:
         if not self.connected:
             return False
         
-        # Set movement parameters
-        if not self.write_register(REG_SPEED, JOG_VELOCITY):
-            return False
-            
-        if not self.write_register(REG_ACCEL, JOG_ACCELERATION):
+        # A motor standing still is at its last target, so the position is only read
+        # back while it moves (or before the first movement)
+        if self._cached_pos is not None and not self.is_moving():
+            current_pos = self._cached_pos
+        else:
+            current_pos = self.get_actual_position()
+        if current_pos is None:
             return False
-            
-        if not self.write_register(REG_DECEL, JOG_DECELERATION):
+        self._cached_pos = None  # Unknown until the new movement is started
+        
+        # Set movement parameters
+        if not self.write_movement_parameters():
             return False
         
         # Set target position (relative to current position)
-        current_pos = self.get_actual_position()
-        if current_pos is not None:
-            target_pos = current_pos + distance
-            if not self.write_register(REG_TARGET_POS, target_pos):
-                return False
-        else:
+        target_pos = current_pos + distance
+        if not self.write_registers(REG_TARGET_POS, to_registers32(target_pos)):
             return False
         
         # Start movement
         if not self.write_register(REG_CONTROL, CTRL_START | CTRL_ENABLE):
             return False
-            
+        
+        self._cached_pos = target_pos
         return True
     
+    def snapshot(self, max_age=SNAPSHOT_MAX_AGE):
+        """Read status and actual position with one request (registers 0-12).
+        A snapshot younger than max_age seconds is reused instead."""
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._snapshot_time < max_age:
+            return self._snapshot
+        
+        regs = self.read_register(0, SNAPSHOT_REGISTERS)
+        if regs is None or len(regs) < SNAPSHOT_REGISTERS:
+            return None
+        self._snapshot = {
+            'status': regs[REG_STATUS],
+            'pos': from_registers32(regs[REG_ACTUAL_POS], regs[REG_ACTUAL_POS + 1])
+        }
+        self._snapshot_time = now
+        if not regs[REG_STATUS] & STATUS_RUNNING:
+            self._cached_pos = self._snapshot['pos']  # Correct any drift from the commanded targets
+        return self._snapshot
+    
     def get_actual_position(self):
         """Get the actual position of the motor"""
-        result = self.read_register(REG_ACTUAL_POS)
-        if result:
-            return result[0]
+        snapshot = self.snapshot()
+        if snapshot:
+            return snapshot['pos']
         return None
     
     def is_ready(self):
         """Check if the motor is ready for commands"""
-        status = self.read_register(REG_STATUS)
-        if status:
-            return (status[0] & STATUS_READY) != 0
+        snapshot = self.snapshot()
+        if snapshot:
+            return (snapshot['status'] & STATUS_READY) != 0
         return False
     
     def is_moving(self):
         """Check if the motor is currently moving"""
-        status = self.read_register(REG_STATUS)
-        if status:
-            return (status[0] & STATUS_RUNNING) != 0
+        snapshot = self.snapshot()
+        if snapshot:
+            return (snapshot['status'] & STATUS_RUNNING) != 0
         return False
 
 class GantryControl:
@@ -270,35 +389,49 @@ class GantryControl:
         self.y_controller = ModbusMotorController(Y_CONTROLLER_IP, MODBUS_PORT)
         self.z_controller = ModbusMotorController(Z_CONTROLLER_IP, MODBUS_PORT)
         
+        # One worker per axis, so Y and Z round trips overlap instead of adding up
+        self.io_pool = ThreadPoolExecutor(max_workers=2)
+        
         # Connect to motors
         self.connect_to_motors()
         
+        # From here on all Modbus traffic runs on the I/O thread: key presses queue
+        # moves for it, and it queues the positions it reads for the Tk thread
+        self.move_queue = queue.Queue()
+        self.position_queue = queue.Queue()
+        self.io_thread = threading.Thread(target=self.io_loop, name="gantry-io", daemon=True)
+        self.io_thread.start()
+        
         # Bind arrow key events
         self.master.bind("<Left>", self.move_left)
         self.master.bind("<Right>", self.move_right)
         self.master.bind("<Up>", self.move_up)
         self.master.bind("<Down>", self.move_down)
         
-        # Start position update timer
+        # Start position display timer
         self.update_position()
         
         # Set up cleanup on window close
         self.master.protocol("WM_DELETE_WINDOW", self.on_closing)
     
+    def on_both_axes(self, func):
+        """Run func(controller) for the Y and Z controllers concurrently; returns both results"""
+        y_future = self.io_pool.submit(func, self.y_controller)
+        z_future = self.io_pool.submit(func, self.z_controller)
+        return y_future.result(), z_future.result()
+    
     def connect_to_motors(self):
         """Connect to motor controllers and initialize them"""
         self.status_label.config(text="Connecting to controllers...")
         self.master.update()
         
-        y_connected = self.y_controller.connect()
-        z_connected = self.z_controller.connect()
+        y_connected, z_connected = self.on_both_axes(ModbusMotorController.connect)
         
         if y_connected and z_connected:
             self.status_label.config(text="Connected to controllers. Initializing motors...")
             self.master.update()
             
-            y_initialized = self.y_controller.initialize_motor()
-            z_initialized = self.z_controller.initialize_motor()
+            y_initialized, z_initialized = self.on_both_axes(ModbusMotorController.initialize_motor)
             
             if y_initialized and z_initialized:
                 self.status_label.config(text="System ready")
@@ -307,43 +440,72 @@ class GantryControl:
         else:
             self.status_label.config(text="Failed to connect to controllers")
     
-    def update_position(self):
-        """Update position display"""
-        if self.y_controller.connected and self.z_controller.connected:
-            y_pos = self.y_controller.get_actual_position()
-            z_pos = self.z_controller.get_actual_position()
+    def io_loop(self):
+        """I/O thread: run queued moves and read both positions every POSITION_POLL_PERIOD"""
+        next_poll = time.monotonic()
+        while True:
+            try:
+                move = self.move_queue.get(timeout=max(0.0, next_poll - time.monotonic()))
+            except queue.Empty:
+                move = ()
+            if move is None:
+                return  # Window closed
+            if move:
+                controller, distance = move
+                if controller.connected and controller.is_ready():
+                    controller.move_relative(distance)
             
+            now = time.monotonic()
+            if now >= next_poll:
+                next_poll = max(next_poll + POSITION_POLL_PERIOD, now)
+                self.poll_positions()
+    
+    def poll_positions(self):
+        """Read both positions (one fresh snapshot per controller, both requests in
+        flight together) and queue them for the display"""
+        if self.y_controller.connected and self.z_controller.connected:
+            y_snapshot, z_snapshot = self.on_both_axes(lambda controller: controller.snapshot(max_age=0))
+            self.position_queue.put((y_snapshot['pos'] if y_snapshot else None,
+                                     z_snapshot['pos'] if z_snapshot else None))
+    
+    def update_position(self):
+        """Update position display with the latest positions read by the I/O thread"""
+        latest = None
+        try:
+            while True:
+                latest = self.position_queue.get_nowait()
+        except queue.Empty:
+            pass
+        
+        if latest is not None:
+            y_pos, z_pos = latest
             if y_pos is not None:
                 self.y_pos_label.config(text=f"Y Position: {y_pos}")
             if z_pos is not None:
                 self.z_pos_label.config(text=f"Z Position: {z_pos}")
         
         # Schedule next update
-        self.master.after(500, self.update_position)
+        self.master.after(DISPLAY_UPDATE_MS, self.update_position)
     
     def move_left(self, event=None):
         """Move Y axis in negative direction"""
         self.flash_button(self.left_button)
-        if self.y_controller.connected and self.y_controller.is_ready():
-            self.y_controller.move_relative(-JOG_DISTANCE)
+        self.move_queue.put((self.y_controller, -JOG_DISTANCE))
     
     def move_right(self, event=None):
         """Move Y axis in positive direction"""
         self.flash_button(self.right_button)
-        if self.y_controller.connected and self.y_controller.is_ready():
-            self.y_controller.move_relative(JOG_DISTANCE)
+        self.move_queue.put((self.y_controller, JOG_DISTANCE))
     
     def move_up(self, event=None):
         """Move Z axis in positive direction"""
         self.flash_button(self.up_button)
-        if self.z_controller.connected and self.z_controller.is_ready():
-            self.z_controller.move_relative(JOG_DISTANCE)
+        self.move_queue.put((self.z_controller, JOG_DISTANCE))
     
     def move_down(self, event=None):
         """Move Z axis in negative direction"""
         self.flash_button(self.down_button)
-        if self.z_controller.connected and self.z_controller.is_ready():
-            self.z_controller.move_relative(-JOG_DISTANCE)
+        self.move_queue.put((self.z_controller, -JOG_DISTANCE))
     
     def flash_button(self, button):
         """Visual feedback for button press"""
@@ -353,10 +515,14 @@ class GantryControl:
     
     def on_closing(self):
         """Clean up resources on window close"""
+        # Let the I/O thread finish its current request before the connections close
+        self.move_queue.put(None)
+        self.io_thread.join()
         if self.y_controller.connected:
             self.y_controller.disconnect()
         if self.z_controller.connected:
             self.z_controller.disconnect()
+        self.io_pool.shutdown()
         self.master.destroy()
 
 